@@ -5,6 +5,21 @@ from sqlalchemy import pool
 
 from alembic import context
 
+import reflex as rx
+
+# Imported so their tables are in the models' metadata.
+from chat_v2.page_chat.chat_messages.model_chat_interaction import (  # noqa: F401
+    ChatInteraction,
+)
+from chat_v2.page_chat.chat_messages.model_rate_limit_snapshot import (  # noqa: F401
+    RateLimitSnapshot,
+)
+
+# Leaves the full-text search index, which isn't part of the models, out of
+# autogenerated migrations. Importing it also registers the same filter as a
+# global autogenerate comparator, for `reflex db makemigrations`.
+from chat_v2.page_chat.chat_messages.search_index import include_object
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -14,11 +29,13 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# The database of the app, rather than the placeholder in alembic.ini.
+config.set_main_option("sqlalchemy.url", rx.config.get_config().db_url)
+
 # add your model's MetaData object here
 # for 'autogenerate' support
-# from myapp import mymodel
-# target_metadata = mymodel.Base.metadata
-target_metadata = None
+target_metadata = rx.ModelRegistry.get_metadata()
+
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -42,6 +59,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -64,7 +82,12 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            render_as_batch=True,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
@@ -0,0 +1,29 @@
+"""index chat interactions for keyset pagination
+
+Revision ID: 5e8a0c9d71b4
+Revises: c41d7e2a8f15
+Create Date: 2026-10-19 19:05:31.662810
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5e8a0c9d71b4"
+down_revision: Union[str, None] = "c41d7e2a8f15"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_chatinteraction_timestamp_id",
+        "chatinteraction",
+        ["timestamp", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_chatinteraction_timestamp_id", "chatinteraction")
@@ -0,0 +1,32 @@
+"""restore the full-text search triggers
+
+Revision ID: 81eba6991677
+Revises: a7f3b2d6e904
+Create Date: 2026-10-19 21:02:37.418562
+
+Before it created them again, migration a7f3b2d6e904 dropped the FTS5 sync
+triggers on SQLite by recreating chatinteraction. This restores them on
+databases it already ran on, and rebuilds the index.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from chat_v2.page_chat.chat_messages.search_index import create_sqlite_triggers
+
+# revision identifiers, used by Alembic.
+revision: str = "81eba6991677"
+down_revision: Union[str, None] = "a7f3b2d6e904"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        create_sqlite_triggers(op.execute)
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,58 @@
+"""full-text search index for chat interactions
+
+Revision ID: 9cb11b043b0a
+Revises: 486580f3ee3b
+Create Date: 2026-10-19 16:40:12.517306
+
+The FTS5 tables (SQLite) and the search_vector column (Postgres) are not part
+of the models. chat_v2/page_chat/chat_messages/search_index.py keeps them out
+of autogenerated migrations, both `alembic revision --autogenerate` and
+`reflex db makemigrations`.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from chat_v2.page_chat.chat_messages.search_index import create_sqlite_triggers
+
+# revision identifiers, used by Alembic.
+revision: str = "9cb11b043b0a"
+down_revision: Union[str, None] = "486580f3ee3b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        # External content FTS5 table, kept in sync by triggers.
+        op.execute(
+            "CREATE VIRTUAL TABLE chatinteraction_fts USING fts5("
+            "prompt, answer, content='chatinteraction', content_rowid='id')"
+        )
+        create_sqlite_triggers(op.execute)
+    elif dialect == "postgresql":
+        op.execute(
+            "ALTER TABLE chatinteraction ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('english', prompt || ' ' || answer)) STORED"
+        )
+        op.create_index(
+            "ix_chatinteraction_search_vector",
+            "chatinteraction",
+            ["search_vector"],
+            postgresql_using="gin",
+        )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute("DROP TRIGGER chatinteraction_fts_update")
+        op.execute("DROP TRIGGER chatinteraction_fts_delete")
+        op.execute("DROP TRIGGER chatinteraction_fts_insert")
+        op.execute("DROP TABLE chatinteraction_fts")
+    elif dialect == "postgresql":
+        op.drop_index("ix_chatinteraction_search_vector", "chatinteraction")
+        op.execute("ALTER TABLE chatinteraction DROP COLUMN search_vector")
@@ -0,0 +1,44 @@
+"""track answers still being streamed
+
+Revision ID: a7f3b2d6e904
+Revises: 5e8a0c9d71b4
+Create Date: 2026-10-19 20:14:52.904117
+
+On SQLite both batch operations recreate chatinteraction, which drops the
+full-text search triggers, so they are created again afterwards.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from chat_v2.page_chat.chat_messages.search_index import create_sqlite_triggers
+
+# revision identifiers, used by Alembic.
+revision: str = "a7f3b2d6e904"
+down_revision: Union[str, None] = "5e8a0c9d71b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("chatinteraction", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "is_complete",
+                sa.Boolean(),
+                server_default=sa.true(),
+                nullable=False,
+            ),
+        )
+    if op.get_bind().dialect.name == "sqlite":
+        create_sqlite_triggers(op.execute)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chatinteraction", schema=None) as batch_op:
+        batch_op.drop_column("is_complete")
+    if op.get_bind().dialect.name == "sqlite":
+        create_sqlite_triggers(op.execute)
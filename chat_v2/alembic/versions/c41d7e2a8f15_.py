@@ -0,0 +1,34 @@
+"""rate limit snapshots
+
+Revision ID: c41d7e2a8f15
+Revises: 9cb11b043b0a
+Create Date: 2026-10-19 17:22:48.103254
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = "c41d7e2a8f15"
+down_revision: Union[str, None] = "9cb11b043b0a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ratelimitsnapshot",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("username", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("submissions", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("username"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ratelimitsnapshot")
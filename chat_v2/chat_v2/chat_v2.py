@@ -2,12 +2,20 @@ import reflex as rx
 
 from .page_chat.chat_page import chat_page
 from .page_chat.chat_state import INPUT_BOX_ID, ChatState
+from .page_chat.checkpoints import answer_checkpointer_lifespan
+from .page_chat.loop_lag import loop_lag_lifespan
+from .page_chat.rate_limit import rate_limiter_lifespan
+from .page_chat.response_cache import response_cache_lifespan
 
 app = rx.App(
     stylesheets=[
         "https://fonts.googleapis.com/css2?family=Inter:wght@100;200;300;400;500;600;700;800;900&display=swap",
     ],
 )
+app.register_lifespan_task(rate_limiter_lifespan)
+app.register_lifespan_task(answer_checkpointer_lifespan)
+app.register_lifespan_task(loop_lag_lifespan)
+app.register_lifespan_task(response_cache_lifespan)
 app.add_page(
     component=chat_page(
         chat_state=ChatState,
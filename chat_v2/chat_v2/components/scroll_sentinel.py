@@ -0,0 +1,55 @@
+import reflex as rx
+from reflex.utils.imports import ImportDict
+
+
+class ScrollSentinel(rx.el.Div):
+    """An empty element that fires on_visible when it is scrolled into view.
+
+    Put it at the edge of a list to load more items as the user scrolls
+    there. Requires an id.
+    """
+
+    # Whether to watch for the element becoming visible
+    enabled: rx.Var[bool]
+
+    # Watching restarts when this changes, so on_visible fires again if the
+    # element is still visible after more items were loaded
+    item_count: rx.Var[int]
+
+    # Fired when the element is scrolled into view
+    on_visible: rx.EventHandler[rx.event.no_args_event_spec]
+
+    def add_imports(
+        self,
+    ) -> ImportDict:
+        return {"react": "useEffect"}
+
+    def add_hooks(
+        self,
+    ) -> list[str | rx.Var[str]]:
+        on_visible = rx.Var.create(self.event_triggers["on_visible"])
+        return [
+            rx.Var(
+                f"""
+            useEffect(() => {{
+                const element = {self.get_ref()}.current;
+                if (!{self.enabled} || !element) return;
+                const observer = new IntersectionObserver((entries) => {{
+                    if (entries.some((entry) => entry.isIntersecting)) {{
+                        {on_visible}();
+                    }}
+                }});
+                observer.observe(element);
+                return () => observer.disconnect();
+            }}, [{self.enabled}, {self.item_count}])
+            """
+            ),
+        ]
+
+    def _exclude_props(
+        self,
+    ) -> list[str]:
+        return ["enabled", "item_count", "on_visible"]
+
+
+scroll_sentinel = ScrollSentinel.create
@@ -1,17 +1,20 @@
 from __future__ import annotations
 
 from enum import Enum
+from typing import Callable
 
 import reflex as rx
 
 from chat_v2.components.avatars import chat_message_avatar
 from chat_v2.components.dividers import chat_date_divider
+from chat_v2.components.scroll_sentinel import scroll_sentinel
 from chat_v2.components.typography import msg_header
 from chat_v2.page_chat.chat_messages.model_chat_interaction import ChatInteraction
 from chat_v2.page_chat.chat_messages.model_chat_message_answer import ANSWER_STYLE
 from chat_v2.page_chat.chat_messages.model_chat_message_question import (
     QUESTION_STYLE,
 )
+from chat_v2.page_chat.streaming import streamed_answer
 from chat_v2.templates.pop_up import dialog_library
 
 
@@ -23,6 +26,7 @@ class MessageType(Enum):
 def message_wrapper(
     chat_interaction: ChatInteraction,
     has_token: bool,
+    is_streaming: bool,
 ):
     def _get_message_question():
         return rx.hstack(
@@ -65,7 +69,13 @@ def message_wrapper(
                     date=chat_interaction.timestamp,
                 ),
                 rx.markdown(
-                    chat_interaction.answer,
+                    # While streaming in append-only mode, the answer only
+                    # exists on the client.
+                    rx.cond(
+                        is_streaming,
+                        streamed_answer.value,
+                        chat_interaction.answer,
+                    ),
                     color=rx.color(
                         color="slate",
                         shade=11,
@@ -92,6 +102,12 @@ def chat_body(
     chat_interactions: list[ChatInteraction],
     divider_title_text: str,
     has_token: bool,
+    ai_streaming: bool,
+    streaming_interaction_id: int | None,
+    has_older_history: bool,
+    on_load_older: Callable,
+    has_newer_history: bool,
+    on_load_newer: Callable,
 ):
     return rx.vstack(
         chat_date_divider(
@@ -99,13 +115,30 @@ def chat_body(
         ),
         rx.scroll_area(
             rx.vstack(
+                # Older history is loaded when scrolling up to the top.
+                scroll_sentinel(
+                    id="chat-history-top",
+                    enabled=has_older_history,
+                    item_count=chat_interactions.length(),
+                    on_visible=on_load_older,
+                ),
                 rx.foreach(
                     chat_interactions,
                     lambda chat_interaction: message_wrapper(
                         chat_interaction=chat_interaction,
                         has_token=has_token,
+                        is_streaming=ai_streaming
+                        & (chat_interaction.id == streaming_interaction_id),
                     ),
                 ),
+                # Newer history, if it was dropped from the window while
+                # scrolling up, is loaded back when scrolling down to the bottom.
+                scroll_sentinel(
+                    id="chat-history-bottom",
+                    enabled=has_newer_history,
+                    item_count=chat_interactions.length(),
+                    on_visible=on_load_newer,
+                ),
                 gap="2em",
             ),
             scrollbars="vertical",
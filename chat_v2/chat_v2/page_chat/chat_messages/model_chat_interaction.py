@@ -4,6 +4,8 @@ import datetime
 
 import pytz
 import reflex as rx
+import sqlalchemy
+import sqlmodel
 
 
 class ChatInteraction(
@@ -12,15 +14,28 @@ class ChatInteraction(
 ):
     """A table for questions and answers in the database."""
 
+    # History is paged by (timestamp, id), newest first.
+    __table_args__ = (
+        sqlalchemy.Index(
+            "ix_chatinteraction_timestamp_id",
+            "timestamp",
+            "id",
+        ),
+    )
+
     prompt: str
     answer: str
     chat_participant_user_name: str
-    timestamp: datetime.datetime = datetime.datetime.now(
-        tz=pytz.timezone(
-            "US/Pacific",
+    timestamp: datetime.datetime = sqlmodel.Field(
+        default_factory=lambda: datetime.datetime.now(
+            tz=pytz.timezone(
+                "US/Pacific",
+            ),
         ),
     )
     chat_participant_user_avatar_url: str = "/avatar-default.png"
+    # False while the answer is being streamed and checkpointed.
+    is_complete: bool = True
 
     chat_participant_assistant_name: str = "Reflex Bot"
     chat_participant_assistant_avatar_url: str = "/reflex-avatar.png"
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+import reflex as rx
+import sqlmodel
+
+
+class RateLimitSnapshot(
+    rx.Model,
+    table=True,
+):
+    """A table of recent submissions per user, to restore rate limits on restart."""
+
+    username: str = sqlmodel.Field(
+        unique=True,
+    )
+    # Space separated UNIX timestamps of the submissions in the current window.
+    submissions: str = ""
@@ -0,0 +1,260 @@
+"""Async database access for chat interactions.
+
+Every query runs on reflex's pooled async engine (`rx.asession`), so handlers
+never block the event loop on the database.
+"""
+
+from __future__ import annotations
+
+import datetime
+import re
+
+import reflex as rx
+from sqlalchemy import (
+    bindparam,
+    column,
+    delete,
+    func,
+    literal_column,
+    or_,
+    select,
+    table,
+    text,
+    tuple_,
+    update,
+)
+
+from .model_chat_interaction import ChatInteraction
+from .model_rate_limit_snapshot import RateLimitSnapshot
+from .search_index import FTS_TABLE
+
+# The FTS5 index over prompts and answers, kept up to date by triggers.
+chat_interaction_fts = table(
+    FTS_TABLE,
+    column("rowid"),
+)
+
+
+def _fts5_query(
+    filter: str,
+) -> str:
+    """Quote each search term, so user input can't use FTS5 query syntax.
+
+    The last term is matched as a prefix, to find results while typing.
+    """
+    terms = re.findall(r"\w+", filter)
+    if not terms:
+        return ""
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+async def search_chat_interactions(
+    filter: str,
+    limit: int,
+) -> list[ChatInteraction]:
+    """Get the questions best matching a filter, using the full-text index.
+
+    SQLite uses the FTS5 table and Postgres the tsvector column added by the
+    migrations. Other databases fall back to a substring match.
+    """
+    async with rx.asession() as asession:
+        dialect = asession.bind.dialect.name
+        if dialect == "sqlite":
+            if not (match := _fts5_query(filter)):
+                return []
+            query = (
+                select(ChatInteraction)
+                .join(
+                    chat_interaction_fts,
+                    chat_interaction_fts.c.rowid == ChatInteraction.id,
+                )
+                .where(text("chatinteraction_fts MATCH :match"))
+                .order_by(text("bm25(chatinteraction_fts)"))
+                .params(match=match)
+            )
+        elif dialect == "postgresql":
+            ts_query = func.websearch_to_tsquery("english", filter)
+            search_vector = literal_column("chatinteraction.search_vector")
+            query = (
+                select(ChatInteraction)
+                .where(search_vector.op("@@")(ts_query))
+                .order_by(func.ts_rank(search_vector, ts_query).desc())
+            )
+        else:
+            query = select(ChatInteraction).where(
+                or_(
+                    ChatInteraction.prompt.ilike(f"%{filter}%"),
+                    ChatInteraction.answer.ilike(f"%{filter}%"),
+                ),
+            )
+        return list(
+            (await asession.exec(query.limit(limit))).scalars().all(),
+        )
+
+
+async def fetch_chat_interactions_page(
+    before: tuple[datetime.datetime, int] | None,
+    limit: int,
+) -> list[ChatInteraction]:
+    """Get the newest questions older than the (timestamp, id) cursor.
+
+    The page is returned oldest first. It is found by seeking the
+    (timestamp, id) index, so every page costs the same however far back it is.
+    """
+    query = select(ChatInteraction)
+    if before is not None:
+        query = query.where(
+            tuple_(ChatInteraction.timestamp, ChatInteraction.id) < before,
+        )
+    async with rx.asession() as asession:
+        page = (
+            (
+                await asession.exec(
+                    query.order_by(
+                        ChatInteraction.timestamp.desc(),
+                        ChatInteraction.id.desc(),
+                    ).limit(limit),
+                )
+            )
+            .scalars()
+            .all()
+        )
+    return list(reversed(page))
+
+
+async def fetch_newer_chat_interactions_page(
+    after: tuple[datetime.datetime, int],
+    limit: int,
+) -> list[ChatInteraction]:
+    """Get the oldest questions newer than the (timestamp, id) cursor.
+
+    The page is returned oldest first, found by seeking the same index as
+    `fetch_chat_interactions_page` in the other direction.
+    """
+    async with rx.asession() as asession:
+        return list(
+            (
+                await asession.exec(
+                    select(ChatInteraction)
+                    .where(
+                        tuple_(ChatInteraction.timestamp, ChatInteraction.id) > after,
+                    )
+                    .order_by(
+                        ChatInteraction.timestamp,
+                        ChatInteraction.id,
+                    )
+                    .limit(limit),
+                )
+            )
+            .scalars()
+            .all(),
+        )
+
+
+async def fetch_chat_interactions(
+    filter: str,
+    limit: int,
+) -> list[ChatInteraction]:
+    """Get the latest questions, or the best matches of a filter."""
+    if filter:
+        return await search_chat_interactions(
+            filter=filter,
+            limit=limit,
+        )
+    return await fetch_chat_interactions_page(
+        before=None,
+        limit=limit,
+    )
+
+
+async def save_chat_interaction(
+    chat_interaction: ChatInteraction,
+) -> None:
+    """Insert a chat interaction."""
+    async with rx.asession() as asession:
+        asession.add(
+            chat_interaction,
+        )
+        await asession.commit()
+        await asession.refresh(chat_interaction)
+
+
+async def save_answer_checkpoints(
+    appends: dict[int, str],
+    completed: set[int],
+) -> None:
+    """Append text to the answers of interactions, and mark some complete.
+
+    Everything is written in one commit.
+    """
+    table = ChatInteraction.__table__
+    async with rx.asession() as asession:
+        if appends:
+            await asession.execute(
+                update(table)
+                .where(table.c.id == bindparam("interaction_id"))
+                .values(answer=table.c.answer + bindparam("text")),
+                [
+                    {"interaction_id": interaction_id, "text": text}
+                    for interaction_id, text in appends.items()
+                ],
+            )
+        if completed:
+            await asession.execute(
+                update(table).where(table.c.id.in_(completed)).values(is_complete=True),
+            )
+        await asession.commit()
+
+
+async def has_asked(
+    username: str,
+    prompt: str,
+) -> bool:
+    """Whether the user already asked this exact question."""
+    async with rx.asession() as asession:
+        return (
+            await asession.exec(
+                select(ChatInteraction.id)
+                .where(
+                    ChatInteraction.chat_participant_user_name == username,
+                )
+                .where(
+                    ChatInteraction.prompt == prompt,
+                )
+                .limit(1),
+            )
+        ).first() is not None
+
+
+async def fetch_rate_limit_snapshots() -> dict[str, list[float]]:
+    """Get the recorded submission times of every user."""
+    async with rx.asession() as asession:
+        return {
+            snapshot.username: [
+                float(submission) for submission in snapshot.submissions.split()
+            ]
+            for snapshot in (await asession.exec(select(RateLimitSnapshot)))
+            .scalars()
+            .all()
+        }
+
+
+async def save_rate_limit_snapshots(
+    submissions: dict[str, list[float]],
+) -> None:
+    """Replace the recorded submission times of the given users."""
+    async with rx.asession() as asession:
+        await asession.exec(
+            delete(RateLimitSnapshot).where(
+                RateLimitSnapshot.username.in_(submissions),
+            ),
+        )
+        asession.add_all(
+            RateLimitSnapshot(
+                username=username,
+                submissions=" ".join(f"{submission:.3f}" for submission in times),
+            )
+            for username, times in submissions.items()
+            if times
+        )
+        await asession.commit()
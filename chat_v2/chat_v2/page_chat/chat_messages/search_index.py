@@ -0,0 +1,139 @@
+"""The full-text search index over chat interactions.
+
+The index isn't part of the models, it is created with raw SQL by migration
+9cb11b043b0a: an external content FTS5 table kept in sync by triggers on
+SQLite, a generated search_vector column with a GIN index on Postgres.
+
+Importing this module registers an autogenerate comparator with alembic that
+leaves the index out of autogenerated migrations, which would otherwise drop
+it. It is registered globally rather than in alembic/env.py, because
+`reflex db makemigrations` configures alembic itself and never runs env.py.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Callable
+
+from alembic.autogenerate import comparators
+from alembic.operations import ops
+from alembic.util import DispatchPriority
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "chatinteraction_fts"  # Also the prefix of its shadow tables
+SEARCH_VECTOR_COLUMN = "search_vector"
+SEARCH_VECTOR_INDEX = "ix_chatinteraction_search_vector"
+
+# The triggers keeping the FTS5 table in sync with chatinteraction. SQLite
+# drops them whenever a batch migration recreates chatinteraction, so those
+# migrations must call `create_sqlite_triggers` afterwards.
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS chatinteraction_fts_insert "
+    "AFTER INSERT ON chatinteraction BEGIN "
+    "INSERT INTO chatinteraction_fts(rowid, prompt, answer) "
+    "VALUES (new.id, new.prompt, new.answer); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS chatinteraction_fts_delete "
+    "AFTER DELETE ON chatinteraction BEGIN "
+    "INSERT INTO chatinteraction_fts(chatinteraction_fts, rowid, prompt, answer) "
+    "VALUES ('delete', old.id, old.prompt, old.answer); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS chatinteraction_fts_update "
+    "AFTER UPDATE ON chatinteraction BEGIN "
+    "INSERT INTO chatinteraction_fts(chatinteraction_fts, rowid, prompt, answer) "
+    "VALUES ('delete', old.id, old.prompt, old.answer); "
+    "INSERT INTO chatinteraction_fts(rowid, prompt, answer) "
+    "VALUES (new.id, new.prompt, new.answer); "
+    "END",
+]
+
+
+def create_sqlite_triggers(
+    execute: Callable[[str], object],
+) -> None:
+    """Create the sync triggers that are missing and rebuild the FTS5 index.
+
+    `execute` runs a SQL statement, e.g. `op.execute` in a migration. The
+    rebuild catches up with rows written while the triggers were missing.
+    """
+    for trigger in SQLITE_TRIGGERS:
+        execute(trigger)
+    execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def include_object(
+    object,
+    name,
+    type_,
+    reflected,
+    compare_to,
+) -> bool:
+    """Leave the search index out of autogenerate, as an alembic filter.
+
+    Covers the FTS5 table and its shadow tables on SQLite, and the
+    search_vector column and its index on Postgres.
+    """
+    if type_ == "table":
+        return not name.startswith(FTS_TABLE)
+    if type_ == "column":
+        return name != SEARCH_VECTOR_COLUMN
+    if type_ == "index":
+        return name != SEARCH_VECTOR_INDEX
+    return True
+
+
+def _is_search_index_op(
+    op: ops.MigrateOperation,
+) -> bool:
+    """Whether an autogenerated operation creates or drops the search index."""
+    if isinstance(op, (ops.CreateTableOp, ops.DropTableOp)):
+        return op.table_name.startswith(FTS_TABLE)
+    if isinstance(op, ops.AddColumnOp):
+        return op.column.name == SEARCH_VECTOR_COLUMN
+    if isinstance(op, (ops.DropColumnOp, ops.AlterColumnOp)):
+        return op.column_name == SEARCH_VECTOR_COLUMN
+    if isinstance(op, (ops.CreateIndexOp, ops.DropIndexOp)):
+        return op.index_name == SEARCH_VECTOR_INDEX
+    return False
+
+
+def _remove_search_index_ops(
+    container: ops.OpContainer,
+) -> None:
+    """Remove the search index operations, and tables left without any."""
+    kept = []
+    for op in container.ops:
+        if _is_search_index_op(op):
+            continue
+        if isinstance(op, ops.OpContainer):
+            _remove_search_index_ops(op)
+            if op.is_empty():
+                continue
+        kept.append(op)
+    container.ops = kept
+
+
+@comparators.dispatch_for(
+    "autogenerate",
+    priority=DispatchPriority.LAST,
+)
+def _leave_out_search_index(
+    autogen_context,
+    upgrade_ops: ops.UpgradeOps,
+) -> None:
+    """Drop the search index from every autogenerated migration.
+
+    Runs after alembic's own comparisons, which produce the operations.
+    """
+    _remove_search_index_ops(upgrade_ops)
+    if autogen_context.dialect.name == "sqlite" and any(
+        isinstance(op, ops.ModifyTableOps) and op.table_name == "chatinteraction"
+        for op in upgrade_ops.ops
+    ):
+        logger.warning(
+            "This migration alters chatinteraction in batch mode, which can "
+            "recreate it and drop the full-text search triggers on SQLite. Call "
+            "search_index.create_sqlite_triggers(op.execute) after each "
+            "batch_alter_table on it, in upgrade() and downgrade().",
+        )
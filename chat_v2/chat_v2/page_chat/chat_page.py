@@ -21,10 +21,17 @@ def _chat_box(
         rx.vstack(
             nav_bar(
                 on_create_new_chat=chat_state.create_new_chat,
+                on_search=chat_state.set_filter,
             ),
             chat_body(
                 chat_interactions=chat_state.chat_interactions,
                 has_token=chat_state.has_token,
+                ai_streaming=chat_state.ai_streaming,
+                streaming_interaction_id=chat_state.streaming_interaction_id,
+                has_older_history=chat_state.has_older_history,
+                on_load_older=chat_state.load_older_messages,
+                has_newer_history=chat_state.has_newer_history,
+                on_load_newer=chat_state.load_newer_messages,
                 divider_title_text=chat_state.timestamp_formatted,
             ),
             input_box(
@@ -1,47 +1,89 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
 import functools
 import os
 
 import pytz
 import reflex as rx
-from openai import OpenAI
+from openai import AsyncOpenAI
+from reflex.event import EventSpec
 
 # Import open-telemetry dependencies
 from opentelemetry import trace
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk import trace as trace_sdk
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+)
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from openinference.semconv.trace import SpanAttributes
 
 from openinference.instrumentation import using_prompt_template
-from sqlalchemy import or_, select
-from together import Together
+from together import AsyncTogether
 
 from .chat_messages.model_chat_interaction import ChatInteraction
+from .chat_messages.repository import (
+    fetch_chat_interactions,
+    fetch_chat_interactions_page,
+    fetch_newer_chat_interactions_page,
+    has_asked,
+    save_chat_interaction,
+)
+from .checkpoints import answer_checkpointer
+from .context import assemble_messages
+from .mock_ai import AsyncMockAI
+from .rate_limit import rate_limiter
+from .response_cache import replay_answer, response_cache
+from .streaming import (
+    STREAM_APPEND_ONLY,
+    TokenCoalescer,
+    append_to_streamed_answer,
+    clear_streamed_answer,
+    iter_answer_text,
+    js_length,
+    set_streamed_answer,
+)
 
 AI_MODEL: str = "UNKNOWN"
 OTEL_HEADERS: str | None = None
 OTEL_ENDPOINT: str | None = None
 RUN_WITH_OTEL: bool = False
 
+# Where spans go without an OTEL provider: "none", "console", "file" (JSON
+# lines in TRACE_FILE) or "memory" (in_memory_span_exporter, for profiling).
+TRACE_EXPORTER: str = os.environ.get("TRACE_EXPORTER", "none")
+TRACE_FILE: str = os.environ.get("TRACE_FILE", "traces.jsonl")
+# Share of requests traced. Child spans follow the decision of their parent.
+TRACE_SAMPLE_RATIO: float = float(os.environ.get("TRACE_SAMPLE_RATIO", 1.0))
+
+in_memory_span_exporter = InMemorySpanExporter()
+
 
 @functools.lru_cache
-def get_ai_client() -> OpenAI | Together:
+def get_ai_client() -> AsyncOpenAI | AsyncTogether | AsyncMockAI:
     ai_provider = os.environ.get("AI_PROVIDER")
     match ai_provider:
         case "openai":
-            return OpenAI(
+            return AsyncOpenAI(
                 api_key=os.environ.get("OPENAI_API_KEY"),
             )
 
         case "together":
-            return Together(
+            return AsyncTogether(
                 api_key=os.environ.get("TOGETHER_API_KEY"),
             )
 
+        case "mock":
+            return AsyncMockAI()
+
         case _:
             print("Invalid AI provider. Please set AI_PROVIDER environment variable")
 
@@ -76,6 +118,9 @@ def get_ai_model() -> None:
         case "together":
             AI_MODEL = "meta-llama/Llama-3.2-90B-Vision-Instruct-Turbo"
 
+        case "mock":
+            AI_MODEL = "mock"
+
         case _:
             print("Invalid AI provider. Please set AI_PROVIDER environment variable")
 
@@ -113,24 +158,48 @@ trace_attributes = {
     "model_id": AI_MODEL,
 }
 
+
+def get_span_exporter() -> SpanExporter | None:
+    if RUN_WITH_OTEL:
+        return OTLPSpanExporter(
+            endpoint=OTEL_ENDPOINT,
+        )
+    match TRACE_EXPORTER:
+        case "console":
+            return ConsoleSpanExporter()
+
+        case "file":
+            return ConsoleSpanExporter(
+                out=open(TRACE_FILE, "a"),
+                formatter=lambda span: span.to_json(indent=None) + os.linesep,
+            )
+
+        case "memory":
+            return in_memory_span_exporter
+
+        case _:
+            return None
+
+
 # Set the tracer provider
 os.environ["OTEL_EXPORTER_OTLP_TRACES_HEADERS"] = OTEL_HEADERS
-tracer_provider = trace_sdk.TracerProvider(
-    resource=Resource(
-        attributes=trace_attributes,
-    ),
-)
-
-if RUN_WITH_OTEL:
+if span_exporter := get_span_exporter():
+    tracer_provider = trace_sdk.TracerProvider(
+        resource=Resource(
+            attributes=trace_attributes,
+        ),
+        sampler=ParentBased(
+            TraceIdRatioBased(TRACE_SAMPLE_RATIO),
+        ),
+    )
     tracer_provider.add_span_processor(
         BatchSpanProcessor(
-            OTLPSpanExporter(
-                endpoint=OTEL_ENDPOINT,
-            ),
+            span_exporter,
         ),
     )
 else:
-    tracer_provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+    # Spans are no-ops, nothing is recorded.
+    tracer_provider = trace.NoOpTracerProvider()
 
 trace.set_tracer_provider(
     tracer_provider=tracer_provider,
@@ -143,21 +212,35 @@ tracer = trace.get_tracer(__name__)
 MAX_QUESTIONS = 10
 INPUT_BOX_ID = "input-box"
 
+# Most interactions kept in state while scrolling through history.
+HISTORY_WINDOW: int = int(os.environ.get("HISTORY_WINDOW", 100))
+
+# Wait for typing to pause this long before searching.
+SEARCH_DEBOUNCE_MS: int = int(os.environ.get("SEARCH_DEBOUNCE_MS", 300))
+
 
 class ChatState(rx.State):
     """The app state."""
 
     filter: str = ""
+    _filter_generation: int = 0
 
     _ai_chat_instance = None
 
     chat_interactions: list[ChatInteraction] = []
+    has_older_history: bool = False
+    # Whether the latest interactions were dropped from the window.
+    has_newer_history: bool = False
 
     has_token: bool = True
     username: str = "Mauro Sicard"
     prompt: str = ""
     result: str = ""
     ai_loading: bool = False
+    ai_streaming: bool = False
+    # The interaction whose answer is being streamed, wherever it is in the
+    # window.
+    streaming_interaction_id: int | None = None
     timestamp: datetime.datetime = datetime.datetime.now(
         tz=pytz.timezone(
             "US/Pacific",
@@ -173,40 +256,147 @@ class ChatState(rx.State):
     @tracer.start_as_current_span("get_client_instance")
     def _get_client_instance(
         self,
-    ) -> OpenAI | Together:
+    ) -> AsyncOpenAI | AsyncTogether | AsyncMockAI:
         if ai_client_instance := get_ai_client():
             return ai_client_instance
 
         raise ValueError("AI client not found")
 
     @tracer.start_as_current_span("fetch_messages")
-    def _fetch_messages(
+    async def _fetch_messages(
         self,
     ) -> list[ChatInteraction]:
-        with rx.session() as session:
-            query = select(ChatInteraction)
-            if self.filter:
-                query = query.where(
-                    or_(
-                        ChatInteraction.prompt.ilike(f"%{self.filter}%"),
-                        ChatInteraction.answer.ilike(f"%{self.filter}%"),
-                    ),
-                )
+        return await fetch_chat_interactions(
+            filter=self.filter,
+            limit=MAX_QUESTIONS,
+        )
 
-            return (
-                session.exec(
-                    query.distinct(ChatInteraction.prompt)
-                    .order_by(ChatInteraction.timestamp.asc())
-                    .limit(MAX_QUESTIONS),
-                )
-                .scalars()
-                .all()
-            )
+    def _set_history(
+        self,
+        chat_interactions: list[ChatInteraction],
+    ) -> None:
+        """Show the latest page of history, or search results."""
+        self.chat_interactions = chat_interactions
+        self.has_older_history = (
+            not self.filter and len(chat_interactions) == MAX_QUESTIONS
+        )
+        self.has_newer_history = False
+
+    def _find_interaction(
+        self,
+        interaction_id: int,
+    ) -> ChatInteraction | None:
+        for chat_interaction in reversed(self.chat_interactions):
+            if chat_interaction.id == interaction_id:
+                return chat_interaction
+        return None
+
+    def _resume_answer(
+        self,
+    ) -> EventSpec | None:
+        """Catch up with an answer still being streamed, e.g. after a reconnect."""
+        if not self.chat_interactions:
+            return None
+        last = self.chat_interactions[-1]
+        if last.is_complete or (text := answer_checkpointer.text(last.id)) is None:
+            return None
+        if last.id == self.streaming_interaction_id:
+            # Already streaming to this session, the client only needs the
+            # text it missed.
+            last.answer = text
+            return set_streamed_answer(text)
+        return ChatState.follow_answer(last.id)
+
+    async def load_messages_from_database(
+        self,
+    ) -> EventSpec | None:
+        self._set_history(await self._fetch_messages())
+        return self._resume_answer()
 
-    def load_messages_from_database(
+    @rx.event(background=True)
+    async def follow_answer(
+        self,
+        interaction_id: int,
+    ):
+        """Stream an answer being generated for another session."""
+        async with self:
+            self.ai_streaming = STREAM_APPEND_ONLY
+            self.streaming_interaction_id = interaction_id
+        yield clear_streamed_answer()
+        answer_parts = []
+        async for offset, text in answer_checkpointer.follow(interaction_id):
+            answer_parts.append(text)
+            if STREAM_APPEND_ONLY:
+                yield append_to_streamed_answer(text, offset)
+            else:
+                async with self:
+                    if chat_interaction := self._find_interaction(interaction_id):
+                        chat_interaction.answer = "".join(answer_parts)
+        async with self:
+            if chat_interaction := self._find_interaction(interaction_id):
+                chat_interaction.answer = "".join(answer_parts)
+                chat_interaction.is_complete = True
+            self.ai_streaming = False
+            self.streaming_interaction_id = None
+
+    async def load_older_messages(
         self,
     ) -> None:
-        self.chat_interactions = self._fetch_messages()
+        if not self.has_older_history or not self.chat_interactions:
+            return
+        oldest = self.chat_interactions[0]
+        page = await fetch_chat_interactions_page(
+            before=(oldest.timestamp, oldest.id),
+            limit=MAX_QUESTIONS,
+        )
+        self.has_older_history = len(page) == MAX_QUESTIONS
+        chat_interactions = page + self.chat_interactions
+        # Only a bounded window is kept, the latest are loaded back when
+        # scrolling down to the bottom.
+        if len(chat_interactions) > HISTORY_WINDOW:
+            chat_interactions = chat_interactions[:HISTORY_WINDOW]
+            self.has_newer_history = True
+        self.chat_interactions = chat_interactions
+
+    async def load_newer_messages(
+        self,
+    ) -> None:
+        if not self.has_newer_history or not self.chat_interactions:
+            return
+        newest = self.chat_interactions[-1]
+        page = await fetch_newer_chat_interactions_page(
+            after=(newest.timestamp, newest.id),
+            limit=MAX_QUESTIONS,
+        )
+        self.has_newer_history = len(page) == MAX_QUESTIONS
+        chat_interactions = self.chat_interactions + page
+        if len(chat_interactions) > HISTORY_WINDOW:
+            chat_interactions = chat_interactions[-HISTORY_WINDOW:]
+            self.has_older_history = True
+        self.chat_interactions = chat_interactions
+
+    @rx.event(background=True)
+    async def set_filter(
+        self,
+        filter: str,
+    ):
+        async with self:
+            self.filter = filter
+            self._filter_generation += 1
+            generation = self._filter_generation
+
+        # Only the last keystroke after a pause runs the query.
+        await asyncio.sleep(SEARCH_DEBOUNCE_MS / 1000)
+        async with self:
+            if generation != self._filter_generation:
+                return
+        chat_interactions = await fetch_chat_interactions(
+            filter=filter,
+            limit=MAX_QUESTIONS,
+        )
+        async with self:
+            if generation == self._filter_generation:
+                self._set_history(chat_interactions)
 
     def set_prompt(
         self,
@@ -219,17 +409,14 @@ class ChatState(rx.State):
     ) -> None:
         pass
 
-    @tracer.start_as_current_span("save_resulting_chat_interaction")
-    def _save_resulting_chat_interaction(
+    @tracer.start_as_current_span("save_chat_interaction")
+    async def _save_chat_interaction(
         self,
         chat_interaction: ChatInteraction,
     ) -> None:
-        with rx.session() as session:
-            session.add(
-                chat_interaction,
-            )
-            session.commit()
-            session.refresh(chat_interaction)
+        await save_chat_interaction(
+            chat_interaction,
+        )
 
     @tracer.start_as_current_span("check_saved_chat_interactions")
     async def _check_saved_chat_interactions(
@@ -237,37 +424,13 @@ class ChatState(rx.State):
         username: str,
         prompt: str,
     ) -> None:
-        with rx.session() as session:
-            if (
-                session.exec(
-                    select(ChatInteraction)
-                    .where(
-                        ChatInteraction.chat_participant_user_name == username,
-                    )
-                    .where(
-                        ChatInteraction.prompt == prompt,
-                    ),
-                ).first()
-                or len(
-                    session.exec(
-                        select(ChatInteraction)
-                        .where(
-                            ChatInteraction.chat_participant_user_name == username,
-                        )
-                        .where(
-                            ChatInteraction.timestamp
-                            > datetime.datetime.now()
-                            - datetime.timedelta(
-                                days=1,
-                            ),
-                        ),
-                    ).all(),
-                )
-                > MAX_QUESTIONS
-            ):
-                raise ValueError(
-                    "You have already asked this question or have asked too many questions in the past 24 hours.",
-                )
+        if await has_asked(
+            username=username,
+            prompt=prompt,
+        ):
+            raise ValueError(
+                "You have already asked this question.",
+            )
 
     @rx.event(background=True)
     async def submit_prompt(
@@ -275,55 +438,10 @@ class ChatState(rx.State):
     ):
         @tracer.start_as_current_span("fetch_chat_completion_session")
         async def _fetch_chat_completion_session(
-            prompt: str,
+            messages: list[dict],
         ):
-            def _create_messages_for_chat_completion():
-                messages = [
-                    {
-                        "role": "system",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "You are a helpful assistant. Respond in markdown.",
-                            },
-                        ],
-                    },
-                ]
-                for chat_interaction in self.chat_interactions:
-                    messages.append(
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": chat_interaction.prompt,
-                                },
-                            ],
-                        },
-                    )
-                    messages.append(
-                        {
-                            "role": "assistant",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": chat_interaction.answer,
-                                },
-                            ],
-                        },
-                    )
-
-                messages.append(
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    },
-                )
-                return messages
-
-            messages = _create_messages_for_chat_completion()
             ai_client_instance = self._get_client_instance()
-            stream = ai_client_instance.chat.completions.create(
+            stream = await ai_client_instance.chat.completions.create(
                 model=AI_MODEL,
                 messages=messages,
                 **get_ai_chat_completion_kwargs(),
@@ -333,24 +451,20 @@ class ChatState(rx.State):
 
             return stream
 
-        @tracer.start_as_current_span("set_ui_loading_state")
         def set_ui_loading_state() -> None:
             self.ai_loading = True
 
-        @tracer.start_as_current_span("clear_ui_loading_state")
         def clear_ui_loading_state() -> None:
             self.result = ""
             self.ai_loading = False
 
-        @tracer.start_as_current_span("add_new_chat_interaction")
-        def add_new_chat_interaction() -> None:
-            self.chat_interactions.append(
-                ChatInteraction(
-                    prompt=prompt,
-                    answer="",
-                    chat_participant_user_name=self.username,
-                ),
-            )
+        def add_new_chat_interaction(
+            chat_interaction: ChatInteraction,
+        ) -> None:
+            self.chat_interactions.append(chat_interaction)
+            if len(self.chat_interactions) > HISTORY_WINDOW:
+                self.chat_interactions.pop(0)
+                self.has_older_history = True
             self.prompt = ""
 
         # Get the question from the form
@@ -358,51 +472,148 @@ class ChatState(rx.State):
             return
 
         prompt = self.prompt
-        if self.username == "":
+        username = self.username
+        if username == "":
             raise ValueError("Username is required")
 
-        await self._check_saved_chat_interactions(
-            prompt=prompt,
-            username=self.username,
-        )
-        async with self:
-            set_ui_loading_state()
-
-            yield
-
-            with using_prompt_template(
-                template=prompt,
+        # Set once the row is saved, so it can be completed whatever happens.
+        interaction_id = None
+        answer_parts = []
+        try:
+            # Checked in memory first, so floods of submissions never reach the
+            # database. The in-flight slot is held until the answer is done.
+            # Spans are only created per request, never per streamed token.
+            with (
+                tracer.start_as_current_span("submit_prompt"),
+                rate_limiter.generation(self.username),
             ):
-                stream = await _fetch_chat_completion_session(prompt)
-                clear_ui_loading_state()
-                add_new_chat_interaction()
-                yield
-
-                try:
-                    for item in stream:
-                        if item.choices and item.choices[0] and item.choices[0].delta:
-                            answer_text = item.choices[0].delta.content
-                            # Ensure answer_text is not None before concatenation
-                            if answer_text is not None:
-                                self.chat_interactions[-1].answer += answer_text
-
-                            else:
-                                answer_text = ""
-                                self.chat_interactions[-1].answer += answer_text
-
-                            yield rx.scroll_to(
-                                elem_id=INPUT_BOX_ID,
-                            )
-
-                except StopAsyncIteration:
-                    raise
-
-                self.result = self.chat_interactions[-1].answer
-                trace.get_current_span().set_attribute(
-                    SpanAttributes.OUTPUT_VALUE,
-                    self.result,
+                await self._check_saved_chat_interactions(
+                    prompt=prompt,
+                    username=self.username,
                 )
-
-        self._save_resulting_chat_interaction(
-            chat_interaction=self.chat_interactions[-1],
-        )
+                # New answers go after the latest interactions, so bring them back
+                # if they were scrolled out of the window.
+                if self.has_newer_history:
+                    latest = await fetch_chat_interactions_page(
+                        before=None,
+                        limit=MAX_QUESTIONS,
+                    )
+                    async with self:
+                        self._set_history(latest)
+                async with self:
+                    set_ui_loading_state()
+
+                # The state lock is only held while applying each change, so other
+                # events for this session keep flowing during long answers.
+                with using_prompt_template(
+                    template=prompt,
+                ):
+                    messages = assemble_messages(
+                        chat_interactions=self.chat_interactions,
+                        prompt=prompt,
+                    )
+                    # Repeated questions are answered from the cache, without
+                    # calling the provider. The history sent is part of the key.
+                    cache_key = response_cache.key(
+                        messages=messages,
+                        model=AI_MODEL,
+                        settings=get_ai_chat_completion_kwargs(),
+                    )
+                    cached_answer = response_cache.get(cache_key)
+                    current_span = trace.get_current_span()
+                    current_span.set_attribute(
+                        "response_cache.hit",
+                        cached_answer is not None,
+                    )
+                    current_span.set_attributes(response_cache.stats())
+                    if cached_answer is not None:
+                        answer_texts = replay_answer(cached_answer)
+                    else:
+                        answer_texts = iter_answer_text(
+                            await _fetch_chat_completion_session(messages),
+                        )
+                    # Only questions that get an answer count against the limits,
+                    # not duplicates or failed provider calls.
+                    rate_limiter.record(username)
+                    # The row is saved before the answer starts, and the answer
+                    # is checkpointed into it while streaming.
+                    chat_interaction = ChatInteraction(
+                        prompt=prompt,
+                        answer="",
+                        chat_participant_user_name=username,
+                        is_complete=False,
+                    )
+                    await self._save_chat_interaction(
+                        chat_interaction,
+                    )
+                    interaction_id = chat_interaction.id
+                    answer_checkpointer.start(interaction_id)
+                    yield clear_streamed_answer()
+                    async with self:
+                        clear_ui_loading_state()
+                        add_new_chat_interaction(chat_interaction)
+                        self.ai_streaming = STREAM_APPEND_ONLY
+                        self.streaming_interaction_id = interaction_id
+
+                    # Tokens are coalesced so the frontend is updated every few ms or
+                    # characters instead of on every token.
+                    answer_length = 0
+                    coalescer = TokenCoalescer()
+
+                    async def publish(
+                        batch: str,
+                    ) -> list[EventSpec]:
+                        nonlocal answer_length
+                        answer_parts.append(batch)
+                        answer_checkpointer.append(interaction_id, batch)
+                        offset = answer_length
+                        answer_length += js_length(batch)
+                        if STREAM_APPEND_ONLY:
+                            return [
+                                append_to_streamed_answer(batch, offset),
+                                rx.scroll_to(elem_id=INPUT_BOX_ID),
+                            ]
+                        async with self:
+                            if chat_interaction := self._find_interaction(
+                                interaction_id
+                            ):
+                                chat_interaction.answer = "".join(answer_parts)
+                        return [rx.scroll_to(elem_id=INPUT_BOX_ID)]
+
+                    async for answer_text in answer_texts:
+                        if batch := coalescer.add(answer_text):
+                            yield await publish(batch)
+                    if batch := coalescer.flush():
+                        yield await publish(batch)
+                    if cached_answer is None and answer_parts:
+                        response_cache.put(cache_key, "".join(answer_parts))
+                    current_span.set_attribute(
+                        SpanAttributes.OUTPUT_VALUE,
+                        "".join(answer_parts),
+                    )
+        except Exception as e:
+            # Rate limits and repeated questions are raised as ValueErrors
+            # meant for the user. Anything else is a failed provider call or
+            # stream.
+            if isinstance(e, ValueError):
+                yield rx.toast.error(str(e))
+            else:
+                print(f"Failed to answer a question: {e!r}")
+                yield rx.toast.error(
+                    "Sorry, the answer failed. Please try again.",
+                )
+        finally:
+            if interaction_id is not None:
+                answer_checkpointer.finish(interaction_id)
+            # Whatever happened, the UI is left ready for the next question,
+            # keeping any part of the answer that was streamed.
+            async with self:
+                if interaction_id is not None and (
+                    chat_interaction := self._find_interaction(interaction_id)
+                ):
+                    chat_interaction.answer = "".join(answer_parts)
+                    chat_interaction.is_complete = True
+                self.ai_loading = False
+                self.ai_streaming = False
+                self.streaming_interaction_id = None
+                self.result = "".join(answer_parts)
@@ -0,0 +1,168 @@
+"""Incremental persistence of answers while they are streamed.
+
+The row of an interaction is inserted when its answer starts, marked
+incomplete. Streamed chunks are queued here and a background writer appends
+them to their rows every `ANSWER_CHECKPOINT_SECONDS`, all rows in one commit,
+so a crashed worker loses at most the last few seconds of an answer.
+
+Answers being streamed are also kept in memory, so a client that reconnects
+or reloads the page can catch up and follow the rest of an answer without
+generating it again. This only works on the worker generating the answer.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+from typing import AsyncIterator
+
+from .chat_messages.repository import save_answer_checkpoints
+from .streaming import js_length
+
+ANSWER_CHECKPOINT_SECONDS: float = float(os.environ.get("ANSWER_CHECKPOINT_SECONDS", 2))
+
+
+class LiveAnswer:
+    """The chunks of an answer being streamed, which can be followed."""
+
+    def __init__(
+        self,
+    ):
+        self.chunks: list[str] = []
+        self.done = False
+        self.changed = asyncio.Event()
+
+    def notify(
+        self,
+    ) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    @property
+    def text(
+        self,
+    ) -> str:
+        return "".join(self.chunks)
+
+
+class AnswerCheckpointer:
+    """Queues streamed chunks for batched writes and tracks live answers."""
+
+    def __init__(
+        self,
+        interval: float = ANSWER_CHECKPOINT_SECONDS,
+    ):
+        self.interval = interval
+        self._live: dict[int, LiveAnswer] = {}
+        self._pending: dict[int, list[str]] = {}
+        self._completed: set[int] = set()
+        self._wakeup = asyncio.Event()
+
+    def start(
+        self,
+        interaction_id: int,
+    ) -> None:
+        self._live[interaction_id] = LiveAnswer()
+
+    def append(
+        self,
+        interaction_id: int,
+        text: str,
+    ) -> None:
+        live = self._live[interaction_id]
+        live.chunks.append(text)
+        live.notify()
+        self._pending.setdefault(interaction_id, []).append(text)
+
+    def finish(
+        self,
+        interaction_id: int,
+    ) -> None:
+        """Mark the answer complete, writing it out without waiting."""
+        if live := self._live.get(interaction_id):
+            live.done = True
+            live.notify()
+        self._completed.add(interaction_id)
+        self._wakeup.set()
+
+    def text(
+        self,
+        interaction_id: int,
+    ) -> str | None:
+        """The answer so far, or None if it isn't being streamed here."""
+        if (live := self._live.get(interaction_id)) is None or live.done:
+            return None
+        return live.text
+
+    async def follow(
+        self,
+        interaction_id: int,
+    ) -> AsyncIterator[tuple[int, str]]:
+        """Yield (offset, text) of the answer so far, then of each new chunk.
+
+        Offsets are in JavaScript string units, for `append_to_streamed_answer`.
+        """
+        if (live := self._live.get(interaction_id)) is None:
+            return
+        index = offset = 0
+        while True:
+            changed = live.changed
+            if index < len(live.chunks):
+                text = "".join(live.chunks[index:])
+                index = len(live.chunks)
+                yield offset, text
+                offset += js_length(text)
+                continue
+            if live.done:
+                return
+            await changed.wait()
+
+    async def flush(
+        self,
+    ) -> None:
+        """Write the queued chunks and completions in one commit."""
+        pending, self._pending = self._pending, {}
+        completed, self._completed = self._completed, set()
+        if not pending and not completed:
+            return
+        try:
+            await save_answer_checkpoints(
+                appends={
+                    interaction_id: "".join(chunks)
+                    for interaction_id, chunks in pending.items()
+                },
+                completed=completed,
+            )
+        except Exception as e:
+            print(f"Failed to checkpoint answers, retrying: {e}")
+            for interaction_id, chunks in pending.items():
+                self._pending.setdefault(interaction_id, [])[:0] = chunks
+            self._completed |= completed
+            return
+        for interaction_id in completed:
+            self._live.pop(interaction_id, None)
+
+    async def run_writer(
+        self,
+    ) -> None:
+        """Flush every interval, or right away when an answer finishes."""
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            self._wakeup.clear()
+            await self.flush()
+
+
+answer_checkpointer = AnswerCheckpointer()
+
+
+@contextlib.asynccontextmanager
+async def answer_checkpointer_lifespan():
+    """Write answer checkpoints in the background, and flush on shutdown."""
+    writer = asyncio.create_task(answer_checkpointer.run_writer())
+    try:
+        yield
+    finally:
+        writer.cancel()
+        await answer_checkpointer.flush()
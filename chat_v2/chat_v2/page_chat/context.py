@@ -0,0 +1,116 @@
+"""Assembly of the messages sent to the chat completion API.
+
+The history sent with a question is bounded by `CONTEXT_TOKEN_BUDGET`: the
+most recent turns are kept while they fit, older turns are left out. Token
+counts are estimated from the text length, which is close enough for
+budgeting without loading a tokenizer, and cheap enough to redo per question.
+
+With `CONTEXT_SUMMARIZE` enabled, the questions of the left out turns are
+listed in a short note instead, capped at `CONTEXT_SUMMARY_TOKENS`. This is
+done without another model call, so it adds nothing to the time to first
+token.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Iterable
+
+from .chat_messages.model_chat_interaction import ChatInteraction
+
+CONTEXT_TOKEN_BUDGET: int = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 3000))
+CONTEXT_SUMMARIZE: bool = os.environ.get("CONTEXT_SUMMARIZE", "false") == "true"
+CONTEXT_SUMMARY_TOKENS: int = int(os.environ.get("CONTEXT_SUMMARY_TOKENS", 200))
+
+SYSTEM_PROMPT = "You are a helpful assistant. Respond in markdown."
+
+CHARS_PER_TOKEN = 4  # Rough average for English text
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators added to every message
+
+
+def estimate_tokens(
+    text: str,
+) -> int:
+    """Estimate the number of tokens of a message with the given text."""
+    return -(-len(text) // CHARS_PER_TOKEN) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _turn_tokens(
+    prompt: str,
+    answer: str,
+) -> int:
+    return estimate_tokens(prompt) + estimate_tokens(answer)
+
+
+def _text_message(
+    role: str,
+    text: str,
+) -> dict:
+    return {
+        "role": role,
+        "content": [
+            {
+                "type": "text",
+                "text": text,
+            },
+        ],
+    }
+
+
+def _summarize(
+    chat_interactions: Iterable[ChatInteraction],
+    max_tokens: int,
+) -> str | None:
+    """List the questions of the left out turns, most recent first."""
+    lines = []
+    tokens = estimate_tokens("Earlier, the user also asked:")
+    for chat_interaction in chat_interactions:
+        line = f"- {chat_interaction.prompt}"
+        tokens += estimate_tokens(line)
+        if tokens > max_tokens:
+            break
+        lines.append(line)
+    if not lines:
+        return None
+    return "\n".join(["Earlier, the user also asked:", *lines])
+
+
+def assemble_messages(
+    chat_interactions: list[ChatInteraction],
+    prompt: str,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    summarize: bool = CONTEXT_SUMMARIZE,
+) -> list[dict]:
+    """The messages for a question, with as much recent history as fits."""
+    budget = token_budget - estimate_tokens(SYSTEM_PROMPT) - estimate_tokens(prompt)
+    if summarize:
+        budget -= CONTEXT_SUMMARY_TOKENS
+
+    kept = 0
+    for chat_interaction in reversed(chat_interactions):
+        turn_tokens = _turn_tokens(chat_interaction.prompt, chat_interaction.answer)
+        if turn_tokens > budget:
+            break
+        budget -= turn_tokens
+        kept += 1
+    older = chat_interactions[: len(chat_interactions) - kept]
+    recent = chat_interactions[len(chat_interactions) - kept :]
+
+    messages = [_text_message("system", SYSTEM_PROMPT)]
+    if (
+        summarize
+        and older
+        and (summary := _summarize(reversed(older), CONTEXT_SUMMARY_TOKENS))
+    ):
+        messages.append(_text_message("system", summary))
+    for chat_interaction in recent:
+        messages.append(_text_message("user", chat_interaction.prompt))
+        messages.append(_text_message("assistant", chat_interaction.answer))
+
+    messages.append(
+        {
+            "role": "user",
+            "content": prompt,
+        },
+    )
+    return messages
@@ -0,0 +1,59 @@
+"""Event loop lag monitor, for load tests.
+
+When `LOOP_LAG_REPORT_SECONDS` is set, the loop is woken up every
+`LOOP_LAG_SAMPLE_MS` and the delay past the expected wake up time is recorded.
+The p50, p99 and max lag are printed every `LOOP_LAG_REPORT_SECONDS`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import statistics
+import time
+
+LOOP_LAG_REPORT_SECONDS: int = int(os.environ.get("LOOP_LAG_REPORT_SECONDS", 0))
+LOOP_LAG_SAMPLE_MS: int = int(os.environ.get("LOOP_LAG_SAMPLE_MS", 50))
+
+
+def summarize_lag(
+    lags_ms: list[float],
+) -> str:
+    if len(lags_ms) < 2:
+        return "no samples"
+    percentiles = statistics.quantiles(lags_ms, n=100, method="inclusive")
+    return (
+        f"p50={percentiles[49]:.1f}ms p99={percentiles[98]:.1f}ms "
+        f"max={max(lags_ms):.1f}ms"
+    )
+
+
+async def monitor_loop_lag(
+    report_seconds: int = LOOP_LAG_REPORT_SECONDS,
+    sample_ms: int = LOOP_LAG_SAMPLE_MS,
+) -> None:
+    lags_ms: list[float] = []
+    reported_at = time.monotonic()
+    while True:
+        expected = time.monotonic() + sample_ms / 1000
+        await asyncio.sleep(sample_ms / 1000)
+        now = time.monotonic()
+        lags_ms.append(max(0.0, now - expected) * 1000)
+        if now - reported_at >= report_seconds:
+            print(f"Event loop lag: {summarize_lag(lags_ms)}")
+            lags_ms.clear()
+            reported_at = now
+
+
+@contextlib.asynccontextmanager
+async def loop_lag_lifespan():
+    """Report the event loop lag in the background, if enabled."""
+    if not LOOP_LAG_REPORT_SECONDS:
+        yield
+        return
+    monitor = asyncio.create_task(monitor_loop_lag())
+    try:
+        yield
+    finally:
+        monitor.cancel()
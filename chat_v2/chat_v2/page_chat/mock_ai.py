@@ -0,0 +1,108 @@
+"""A local stand-in for the chat completion API, for offline load tests.
+
+Selected with `AI_PROVIDER=mock`. It streams `MOCK_AI_TOKENS` words that only
+depend on the prompt, waiting `MOCK_AI_FIRST_TOKEN_MS` before the first one and
+`MOCK_AI_TOKEN_MS` between the others. Only the parts of the OpenAI client
+used by the app are implemented.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import hashlib
+import os
+from typing import AsyncIterator
+
+MOCK_AI_TOKENS: int = int(os.environ.get("MOCK_AI_TOKENS", 200))
+MOCK_AI_FIRST_TOKEN_MS: int = int(os.environ.get("MOCK_AI_FIRST_TOKEN_MS", 300))
+MOCK_AI_TOKEN_MS: int = int(os.environ.get("MOCK_AI_TOKEN_MS", 20))
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua"
+).split()
+
+
+@dataclasses.dataclass
+class Delta:
+    content: str | None
+
+
+@dataclasses.dataclass
+class Choice:
+    delta: Delta
+
+
+@dataclasses.dataclass
+class ChatCompletionChunk:
+    choices: list[Choice]
+
+
+def mock_tokens(
+    prompt: str,
+    count: int,
+) -> list[str]:
+    """The tokens of the answer to a prompt, the same on every call."""
+    start = int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:4], "little")
+    return [f"{WORDS[(start + i) % len(WORDS)]} " for i in range(count)]
+
+
+async def _stream(
+    tokens: list[str],
+    first_token_ms: int,
+    token_ms: int,
+) -> AsyncIterator[ChatCompletionChunk]:
+    await asyncio.sleep(first_token_ms / 1000)
+    for i, token in enumerate(tokens):
+        if i:
+            await asyncio.sleep(token_ms / 1000)
+        yield ChatCompletionChunk(choices=[Choice(delta=Delta(content=token))])
+
+
+class _Completions:
+    def __init__(
+        self,
+        client: AsyncMockAI,
+    ):
+        self._client = client
+
+    async def create(
+        self,
+        model: str,
+        messages: list[dict],
+        max_tokens: int | None = None,
+        **kwargs,
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        prompt = messages[-1]["content"]
+        count = self._client.tokens
+        if max_tokens is not None:
+            count = min(count, max_tokens)
+        return _stream(
+            mock_tokens(prompt, count),
+            self._client.first_token_ms,
+            self._client.token_ms,
+        )
+
+
+class _Chat:
+    def __init__(
+        self,
+        client: AsyncMockAI,
+    ):
+        self.completions = _Completions(client)
+
+
+class AsyncMockAI:
+    """Streams deterministic answers with a configurable latency."""
+
+    def __init__(
+        self,
+        tokens: int = MOCK_AI_TOKENS,
+        first_token_ms: int = MOCK_AI_FIRST_TOKEN_MS,
+        token_ms: int = MOCK_AI_TOKEN_MS,
+    ):
+        self.tokens = tokens
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.chat = _Chat(self)
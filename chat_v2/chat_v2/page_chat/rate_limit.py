@@ -0,0 +1,246 @@
+"""In-memory rate limits on chat submissions, per username.
+
+Three limits are checked without touching the database:
+
+- a sliding window of `RATE_LIMIT_MAX_QUESTIONS` questions per
+  `RATE_LIMIT_WINDOW_SECONDS`,
+- a token bucket of `RATE_LIMIT_BURST` questions, refilled every
+  `RATE_LIMIT_REFILL_SECONDS`, against rapid fire submissions,
+- at most `RATE_LIMIT_MAX_IN_FLIGHT` answers being generated at once.
+
+A question only counts against the window and the bucket once it is
+answered, so rejected duplicates and failed provider calls are free. Users
+with nothing left to limit are forgotten.
+
+The sliding windows are saved to the database every
+`RATE_LIMIT_SNAPSHOT_SECONDS`, and restored on startup. The limits are per
+process, so with several workers each one enforces them on its own.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import os
+import time
+
+from .chat_messages.repository import (
+    fetch_rate_limit_snapshots,
+    save_rate_limit_snapshots,
+)
+
+RATE_LIMIT_MAX_QUESTIONS: int = int(os.environ.get("RATE_LIMIT_MAX_QUESTIONS", 10))
+RATE_LIMIT_WINDOW_SECONDS: int = int(
+    os.environ.get("RATE_LIMIT_WINDOW_SECONDS", 24 * 60 * 60)
+)
+RATE_LIMIT_BURST: int = int(os.environ.get("RATE_LIMIT_BURST", 3))
+RATE_LIMIT_REFILL_SECONDS: float = float(
+    os.environ.get("RATE_LIMIT_REFILL_SECONDS", 10)
+)
+RATE_LIMIT_MAX_IN_FLIGHT: int = int(os.environ.get("RATE_LIMIT_MAX_IN_FLIGHT", 1))
+RATE_LIMIT_SNAPSHOT_SECONDS: int = int(
+    os.environ.get("RATE_LIMIT_SNAPSHOT_SECONDS", 30)
+)
+
+
+class RateLimitExceeded(ValueError):
+    """Raised when a user may not submit another question right now."""
+
+
+class _UserLimits:
+    __slots__ = ("submissions", "tokens", "refilled_at", "in_flight")
+
+    def __init__(
+        self,
+        burst: int,
+    ):
+        # Wall clock times, so they survive a restart through the snapshot.
+        self.submissions: collections.deque[float] = collections.deque()
+        self.tokens: float = burst
+        self.refilled_at: float = time.monotonic()
+        self.in_flight: int = 0
+
+
+class RateLimiter:
+    """Sliding window, token bucket and concurrency limits per username."""
+
+    def __init__(
+        self,
+        max_questions: int = RATE_LIMIT_MAX_QUESTIONS,
+        window_seconds: int = RATE_LIMIT_WINDOW_SECONDS,
+        burst: int = RATE_LIMIT_BURST,
+        refill_seconds: float = RATE_LIMIT_REFILL_SECONDS,
+        max_in_flight: int = RATE_LIMIT_MAX_IN_FLIGHT,
+    ):
+        self.max_questions = max_questions
+        self.window_seconds = window_seconds
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        self.max_in_flight = max_in_flight
+        self._users: dict[str, _UserLimits] = {}
+        self._dirty: set[str] = set()
+
+    def _limits(
+        self,
+        username: str,
+    ) -> _UserLimits:
+        if (limits := self._users.get(username)) is None:
+            limits = self._users[username] = _UserLimits(self.burst)
+        return limits
+
+    def _expire(
+        self,
+        limits: _UserLimits,
+        now: float,
+    ) -> None:
+        """Drop submissions that slid out of the window."""
+        cutoff = now - self.window_seconds
+        while limits.submissions and limits.submissions[0] <= cutoff:
+            limits.submissions.popleft()
+
+    def _refill(
+        self,
+        limits: _UserLimits,
+    ) -> None:
+        now = time.monotonic()
+        limits.tokens = min(
+            self.burst,
+            limits.tokens + (now - limits.refilled_at) / self.refill_seconds,
+        )
+        limits.refilled_at = now
+
+    def acquire(
+        self,
+        username: str,
+    ) -> None:
+        """Take an in-flight slot, or raise if the user is over any of the limits.
+
+        The submission is only counted against the window and the bucket by
+        `record`, once it is known to be answered. This never awaits, so
+        checking and taking the slot is atomic on the event loop.
+        """
+        limits = self._limits(username)
+        now = time.time()
+        self._expire(limits, now)
+        if len(limits.submissions) >= self.max_questions:
+            raise RateLimitExceeded(
+                f"You have asked too many questions in the past {self.window_seconds // 3600} hours.",
+            )
+        self._refill(limits)
+        if limits.tokens < 1:
+            raise RateLimitExceeded(
+                "You are asking questions too quickly. Please wait a moment.",
+            )
+        if limits.in_flight >= self.max_in_flight:
+            raise RateLimitExceeded(
+                "Please wait for the current answer to finish.",
+            )
+        limits.in_flight += 1
+
+    def record(
+        self,
+        username: str,
+    ) -> None:
+        """Count a submission that is being answered."""
+        limits = self._limits(username)
+        self._refill(limits)
+        limits.tokens = max(0.0, limits.tokens - 1)
+        limits.submissions.append(time.time())
+        self._dirty.add(username)
+
+    def release(
+        self,
+        username: str,
+    ) -> None:
+        """Mark an answer of the user as no longer being generated."""
+        limits = self._limits(username)
+        limits.in_flight = max(0, limits.in_flight - 1)
+        self._evict_if_idle(username, limits, time.time())
+
+    def _evict_if_idle(
+        self,
+        username: str,
+        limits: _UserLimits,
+        now: float,
+    ) -> None:
+        """Forget a user with nothing in flight, in the window or owed to the bucket."""
+        if limits.in_flight:
+            return
+        self._expire(limits, now)
+        self._refill(limits)
+        if not limits.submissions and limits.tokens >= self.burst:
+            del self._users[username]
+
+    @contextlib.contextmanager
+    def generation(
+        self,
+        username: str,
+    ):
+        """Hold one of the user's in-flight slots while an answer is generated."""
+        self.acquire(username)
+        try:
+            yield
+        finally:
+            self.release(username)
+
+    def restore(
+        self,
+        snapshots: dict[str, list[float]],
+    ) -> None:
+        """Restore the sliding windows from a snapshot."""
+        now = time.time()
+        for username, submissions in snapshots.items():
+            limits = self._limits(username)
+            limits.submissions.extend(sorted(submissions))
+            self._expire(limits, now)
+
+    def take_snapshot(
+        self,
+    ) -> dict[str, list[float]]:
+        """The sliding windows of the users that submitted since the last call.
+
+        Idle users are forgotten meanwhile, an empty window clears their saved
+        one.
+        """
+        now = time.time()
+        snapshot = {}
+        for username in self._dirty:
+            if (limits := self._users.get(username)) is None:
+                snapshot[username] = []
+                continue
+            self._expire(limits, now)
+            snapshot[username] = list(limits.submissions)
+        self._dirty.clear()
+        for username, limits in list(self._users.items()):
+            self._evict_if_idle(username, limits, now)
+        return snapshot
+
+    async def save(
+        self,
+    ) -> None:
+        if snapshot := self.take_snapshot():
+            await save_rate_limit_snapshots(snapshot)
+
+    async def run_snapshots(
+        self,
+    ) -> None:
+        """Save the sliding windows to the database periodically."""
+        while True:
+            await asyncio.sleep(RATE_LIMIT_SNAPSHOT_SECONDS)
+            await self.save()
+
+
+rate_limiter = RateLimiter()
+
+
+@contextlib.asynccontextmanager
+async def rate_limiter_lifespan():
+    """Restore the rate limits on startup and snapshot them in the background."""
+    rate_limiter.restore(await fetch_rate_limit_snapshots())
+    snapshots = asyncio.create_task(rate_limiter.run_snapshots())
+    try:
+        yield
+    finally:
+        snapshots.cancel()
+        await rate_limiter.save()
@@ -0,0 +1,164 @@
+"""A cache of answers to repeated questions.
+
+Answers are keyed by the normalized prompt, the history sent with it, the
+model and the completion settings. Many users asking the same opening question
+share one provider call, while follow-up questions only reuse an answer given
+in the same conversation. Hit-rate counters are printed every
+`RESPONSE_CACHE_REPORT_SECONDS`, when there were lookups.
+Entries expire after `RESPONSE_CACHE_TTL_SECONDS`, and the least recently used
+ones are evicted beyond `RESPONSE_CACHE_SIZE`. A cached answer is replayed in
+chunks, so it streams in like a fresh one.
+
+The cache is per process.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import time
+from typing import AsyncIterator
+
+RESPONSE_CACHE_SIZE: int = int(os.environ.get("RESPONSE_CACHE_SIZE", 512))
+RESPONSE_CACHE_TTL_SECONDS: int = int(
+    os.environ.get("RESPONSE_CACHE_TTL_SECONDS", 60 * 60)
+)
+# Cached answers are replayed this many characters at a time, with a delay.
+RESPONSE_CACHE_REPLAY_CHARS: int = int(
+    os.environ.get("RESPONSE_CACHE_REPLAY_CHARS", 24)
+)
+RESPONSE_CACHE_REPLAY_DELAY_MS: int = int(
+    os.environ.get("RESPONSE_CACHE_REPLAY_DELAY_MS", 15)
+)
+RESPONSE_CACHE_REPORT_SECONDS: int = int(
+    os.environ.get("RESPONSE_CACHE_REPORT_SECONDS", 300)
+)
+
+
+def normalize_prompt(
+    prompt: str,
+) -> str:
+    """Ignore case and whitespace differences between prompts."""
+    return " ".join(prompt.casefold().split())
+
+
+class ResponseCache:
+    """A size bounded LRU cache of answers, with a TTL and hit-rate counters."""
+
+    def __init__(
+        self,
+        max_size: int = RESPONSE_CACHE_SIZE,
+        ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # key -> (expiry time, answer), least recently used first.
+        self._entries: collections.OrderedDict[str, tuple[float, str]] = (
+            collections.OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(
+        messages: list[dict],
+        model: str,
+        settings: dict,
+    ) -> str:
+        """The key of the messages sent for a question, which is the last one."""
+        *history, question = messages
+        return hashlib.sha256(
+            json.dumps(
+                [history, normalize_prompt(question["content"]), model, settings],
+                sort_keys=True,
+            ).encode(),
+        ).hexdigest()
+
+    def get(
+        self,
+        key: str,
+    ) -> str | None:
+        """The cached answer, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(
+        self,
+        key: str,
+        answer: str,
+    ) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @property
+    def hit_rate(
+        self,
+    ) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(
+        self,
+    ) -> dict[str, int | float]:
+        return {
+            "response_cache.hits": self.hits,
+            "response_cache.misses": self.misses,
+            "response_cache.hit_rate": self.hit_rate,
+            "response_cache.size": len(self._entries),
+        }
+
+    async def run_reports(
+        self,
+        report_seconds: int = RESPONSE_CACHE_REPORT_SECONDS,
+    ) -> None:
+        """Print the hit-rate counters periodically, if there were lookups."""
+        lookups = 0
+        while True:
+            await asyncio.sleep(report_seconds)
+            if self.hits + self.misses == lookups:
+                continue
+            lookups = self.hits + self.misses
+            print(
+                f"Response cache: {self.hits} hits, {self.misses} misses "
+                f"({self.hit_rate:.1%} hit rate), {len(self._entries)} entries"
+            )
+
+
+async def replay_answer(
+    answer: str,
+    chunk_chars: int = RESPONSE_CACHE_REPLAY_CHARS,
+    delay_ms: int = RESPONSE_CACHE_REPLAY_DELAY_MS,
+) -> AsyncIterator[str]:
+    """Yield a cached answer in chunks, like a provider stream."""
+    for start in range(0, len(answer), chunk_chars):
+        yield answer[start : start + chunk_chars]
+        await asyncio.sleep(delay_ms / 1000)
+
+
+response_cache = ResponseCache()
+
+
+@contextlib.asynccontextmanager
+async def response_cache_lifespan():
+    """Report the response cache hit rate in the background, if enabled."""
+    if not RESPONSE_CACHE_REPORT_SECONDS:
+        yield
+        return
+    reports = asyncio.create_task(response_cache.run_reports())
+    try:
+        yield
+    finally:
+        reports.cancel()
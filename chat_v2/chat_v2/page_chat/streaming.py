@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import AsyncIterator
+
+import reflex as rx
+from reflex.event import EventSpec
+from reflex.experimental.client_state import ClientStateVar
+
+# Flush streamed tokens to the frontend at most every N ms, or every M characters.
+STREAM_FLUSH_INTERVAL_MS: int = int(os.environ.get("STREAM_FLUSH_INTERVAL_MS", 100))
+STREAM_FLUSH_CHARS: int = int(os.environ.get("STREAM_FLUSH_CHARS", 512))
+
+# In append-only mode only new text is sent while streaming, instead of the
+# whole chat history on every update.
+STREAM_APPEND_ONLY: bool = os.environ.get("STREAM_APPEND_ONLY", "true") == "true"
+
+# The answer being streamed, kept on the client in append-only mode.
+streamed_answer = ClientStateVar.create(
+    "streamed_answer",
+    default="",
+)
+
+
+def js_length(
+    text: str,
+) -> int:
+    """The length of the text in JavaScript, in UTF-16 code units."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def append_to_streamed_answer(
+    text: str,
+    offset: int,
+) -> EventSpec:
+    """Write text at the given offset of the streamed answer on the client.
+
+    Text the client already has, e.g. from `set_streamed_answer` after a
+    reconnect, is overwritten rather than duplicated. If the client is missing
+    text before the offset, the write is dropped until the next resync.
+    """
+    return rx.call_script(
+        f"{streamed_answer.set}(((answer) => answer.length >= {offset} "
+        f"? answer.slice(0, {offset}) + {json.dumps(text)} : answer)"
+        f"(refs['_client_state_streamed_answer'] ?? ''))",
+    )
+
+
+def set_streamed_answer(
+    text: str,
+) -> EventSpec:
+    """Replace the streamed answer on the client."""
+    return streamed_answer.push(text)
+
+
+def clear_streamed_answer() -> EventSpec:
+    """Clear the streamed answer on the client."""
+    return set_streamed_answer("")
+
+
+async def iter_answer_text(
+    stream,
+) -> AsyncIterator[str]:
+    """Yield the text of each chunk of a chat completion stream."""
+    async for item in stream:
+        if item.choices and item.choices[0] and item.choices[0].delta:
+            answer_text = item.choices[0].delta.content
+            # Ensure answer_text is not None before concatenation
+            if answer_text is not None:
+                yield answer_text
+
+
+class TokenCoalescer:
+    """Collects streamed tokens and releases them in batches."""
+
+    def __init__(
+        self,
+        interval_ms: int = STREAM_FLUSH_INTERVAL_MS,
+        max_chars: int = STREAM_FLUSH_CHARS,
+    ):
+        self.interval = interval_ms / 1000
+        self.max_chars = max_chars
+        self._parts: list[str] = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+
+    def add(
+        self,
+        text: str,
+    ) -> str | None:
+        """Add a token, returning the batch if it is due to be flushed."""
+        self._parts.append(text)
+        self._size += len(text)
+        if (
+            self._size >= self.max_chars
+            or time.monotonic() - self._last_flush >= self.interval
+        ):
+            return self.flush()
+        return None
+
+    def flush(
+        self,
+    ) -> str:
+        """Release every pending token as one batch."""
+        batch = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        self._last_flush = time.monotonic()
+        return batch
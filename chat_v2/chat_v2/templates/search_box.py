@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
+from typing import Callable
 
 import reflex as rx
 
@@ -40,6 +41,7 @@ SEARCH_BAR_STYLE: Style = Style()
 
 def _search_bar_base(
     *args,
+    on_change: Callable | None = None,
     **kwargs,
 ):
     """Creates a common search box."""
@@ -58,6 +60,7 @@ def _search_bar_base(
             placeholder="Search for chats...",
             background_color="transparent",
             color=rx.color("slate", 11),
+            on_change=on_change,
         ),
         rx.spacer(),
         *args,
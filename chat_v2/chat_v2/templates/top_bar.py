@@ -6,6 +6,7 @@ from typing import Callable
 import reflex as rx
 
 from chat_v2.components.buttons import button_with_icon
+from chat_v2.templates.search_box import search_bar_with_sidebar_shortcut
 
 
 @dataclass
@@ -45,11 +46,15 @@ NAV_BAR_STYLE: Style = Style()
 
 def nav_bar(
     on_create_new_chat: Callable,
+    on_search: Callable,
 ):
     return rx.hstack(
         rx.hstack(
             # toggle theme
             rx.color_mode.button(),
+            search_bar_with_sidebar_shortcut(
+                on_change=on_search,
+            ),
             **NAV_BAR_STYLE.component,
         ),
         button_with_icon(
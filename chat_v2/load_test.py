@@ -0,0 +1,219 @@
+"""Load test for the chat pipeline, over the app's websocket.
+
+Each session connects like a browser tab, sets a unique prompt and runs
+`submit_prompt`, then waits for the answer to finish. The script reports
+time to first token, tokens per second, p99 end-to-end latency and the lag
+of its own event loop (to tell when the harness itself is the bottleneck).
+
+Start the backend with the mock provider and limits that fit the test, e.g.
+
+    AI_PROVIDER=mock RATE_LIMIT_MAX_QUESTIONS=1000000 RATE_LIMIT_BURST=1000000 \\
+    RATE_LIMIT_MAX_IN_FLIGHT=1000000 RESPONSE_CACHE_SIZE=0 \\
+    LOOP_LAG_REPORT_SECONDS=5 reflex run --env prod --backend-only
+
+then run `python load_test.py --sessions 50 --rounds 3`. The server prints
+its own event loop lag every LOOP_LAG_REPORT_SECONDS.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import statistics
+import time
+import uuid
+
+import socketio
+
+CHAT_STATE = "reflex___state____state.chat_v2___page_chat___chat_state____chat_state"
+ROUTER_DATA = {"pathname": "/", "query": {}, "asPath": "/"}
+# Reflex serves its socket at /_event, in the namespace of the same name.
+EVENT_PATH = "/_event"
+
+
+@dataclasses.dataclass
+class Result:
+    ttft: float
+    latency: float
+    tokens: int
+
+
+def _find(
+    delta: dict,
+    name: str,
+):
+    """The value of a state var in a delta, if it changed."""
+    for substate in delta.values():
+        for key, value in substate.items():
+            if key == name or key.startswith(f"{name}_rx_state_"):
+                return value
+    return None
+
+
+def _has_answer_text(
+    update: dict,
+) -> bool:
+    """Whether the update carries streamed answer text."""
+    if any(
+        "_client_state_streamed_answer" in str(event.get("payload", {}))
+        for event in update.get("events", [])
+    ):
+        return True
+    chat_interactions = _find(update.get("delta", {}), "chat_interactions")
+    return bool(chat_interactions and chat_interactions[-1]["answer"])
+
+
+async def run_session(
+    url: str,
+    session: int,
+    rounds: int,
+    timeout: float,
+    results: list[Result],
+    errors: list[str],
+) -> None:
+    token = str(uuid.uuid4())
+    client = socketio.AsyncClient()
+    updates: asyncio.Queue[dict] = asyncio.Queue()
+    client.on("event", updates.put_nowait, namespace=EVENT_PATH)
+    await client.connect(
+        f"{url}?token={token}",
+        socketio_path=EVENT_PATH,
+        namespaces=[EVENT_PATH],
+        transports=["websocket"],
+    )
+
+    async def emit(
+        name: str,
+        payload: dict,
+    ) -> None:
+        await client.emit(
+            "event",
+            {
+                "token": token,
+                "name": f"{CHAT_STATE}.{name}",
+                "payload": payload,
+                "router_data": ROUTER_DATA,
+            },
+            namespace=EVENT_PATH,
+        )
+
+    try:
+        for i in range(rounds):
+            await emit("set_prompt", {"prompt": f"Load test {session}-{i} {token}"})
+            started_at = time.perf_counter()
+            first_token_at = None
+            await emit("submit_prompt", {})
+            while True:
+                # Errors are only logged by the server, so don't wait forever.
+                update = await asyncio.wait_for(updates.get(), timeout)
+                if first_token_at is None and _has_answer_text(update):
+                    first_token_at = time.perf_counter()
+                if result := _find(update.get("delta", {}), "result"):
+                    break
+            finished_at = time.perf_counter()
+            results.append(
+                Result(
+                    ttft=(first_token_at or finished_at) - started_at,
+                    latency=finished_at - started_at,
+                    tokens=len(result.split()),
+                ),
+            )
+    except (Exception, asyncio.TimeoutError) as e:
+        errors.append(f"session {session}: {e!r}")
+    finally:
+        await client.disconnect()
+
+
+async def measure_loop_lag(
+    lags: list[float],
+    sample_seconds: float = 0.05,
+) -> None:
+    while True:
+        expected = time.perf_counter() + sample_seconds
+        await asyncio.sleep(sample_seconds)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+def _percentile(
+    values: list[float],
+    percentile: int,
+) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[percentile - 1]
+
+
+def report(
+    results: list[Result],
+    errors: list[str],
+    lags: list[float],
+    elapsed: float,
+) -> None:
+    print(f"{len(results)} answers in {elapsed:.1f}s, {len(errors)} errors")
+    for error in errors[:10]:
+        print(f"  {error}")
+    if not results:
+        return
+    ttfts = [result.ttft * 1000 for result in results]
+    latencies = [result.latency * 1000 for result in results]
+    tokens_per_second = [
+        result.tokens / (result.latency - result.ttft)
+        for result in results
+        if result.latency > result.ttft
+    ]
+    lags_ms = [lag * 1000 for lag in lags]
+    print(
+        f"time to first token: p50={_percentile(ttfts, 50):.0f}ms "
+        f"p99={_percentile(ttfts, 99):.0f}ms",
+    )
+    print(
+        f"end-to-end latency:  p50={_percentile(latencies, 50):.0f}ms "
+        f"p99={_percentile(latencies, 99):.0f}ms",
+    )
+    if tokens_per_second:
+        print(
+            f"tokens/sec per answer: mean={statistics.mean(tokens_per_second):.1f} "
+            f"total={sum(result.tokens for result in results) / elapsed:.1f}",
+        )
+    print(
+        f"harness loop lag:    p99={_percentile(lags_ms, 99):.1f}ms "
+        f"max={max(lags_ms, default=0):.1f}ms",
+    )
+
+
+async def main(
+    url: str,
+    sessions: int,
+    rounds: int,
+    timeout: float,
+) -> None:
+    results: list[Result] = []
+    errors: list[str] = []
+    lags: list[float] = []
+    lag_monitor = asyncio.create_task(measure_loop_lag(lags))
+    started_at = time.perf_counter()
+    await asyncio.gather(
+        *(
+            run_session(url, session, rounds, timeout, results, errors)
+            for session in range(sessions)
+        ),
+    )
+    elapsed = time.perf_counter() - started_at
+    lag_monitor.cancel()
+    report(results, errors, lags, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="Seconds to wait for each update before giving up on a session",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.sessions, args.rounds, args.timeout))
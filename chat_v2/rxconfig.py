@@ -2,5 +2,7 @@ import reflex as rx
 
 config = rx.Config(
     app_name="chat_v2",
+    db_url="sqlite:///reflex.db",
+    async_db_url="sqlite+aiosqlite:///reflex.db",
     tailwind=None,
 )
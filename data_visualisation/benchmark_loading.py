@@ -0,0 +1,154 @@
+"""Benchmark for loading large data files into each model.
+
+Writes a file of `--rows` generated rows for each of `Customer`, `Cereals`,
+`Covid` and `Countries`, in the `--format` given (csv, xlsx or json), then
+loads it with the streaming bulk loader and reports rows per second. The
+loader also logs the peak RSS of the process. With `--baseline`, the same
+file is also loaded as the loader used to: read whole, then one ORM object
+added per row, for comparison (slow for 1M rows).
+
+    python benchmark_loading.py --rows 1000000 --chunk-size 5000 --format json
+
+The database is a fresh SQLite file in a temporary directory unless
+DATABASE_URL is set. Tables of the models are emptied before each run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+
+import openpyxl
+import pandas as pd
+
+WORK_DIR = tempfile.mkdtemp(prefix="data_visualisation_benchmark_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{WORK_DIR}/benchmark.db")
+
+import reflex as rx  # noqa: E402
+from sqlmodel import SQLModel, delete  # noqa: E402
+
+from data_visualisation.data_loading import (  # noqa: E402
+    BULK_INSERT_CHUNK_SIZE,
+    loading_data,
+)
+from data_visualisation.models import Cereals, Countries, Covid, Customer  # noqa: E402
+
+MODELS = [Customer, Cereals, Covid, Countries]
+FORMATS = ["csv", "xlsx", "json"]
+
+
+def fields(model: type[rx.Model]) -> list[str]:
+    return [field for field in model.__fields__ if field != "id"]
+
+
+def write_data_file(
+    model: type[rx.Model],
+    rows: int,
+    data_format: str,
+) -> str:
+    path = os.path.join(WORK_DIR, f"{model.__name__.lower()}.{data_format}")
+    columns = fields(model)
+    values = ([f"{column}-{i}" for column in columns] for i in range(rows))
+    if data_format == "csv":
+        with open(path, mode="w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            writer.writerows(values)
+    elif data_format == "xlsx":
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(columns)
+        for row in values:
+            sheet.append(row)
+        workbook.save(path)
+    else:
+        with open(path, mode="w", encoding="utf-8") as file:
+            file.write("[\n")
+            for i, row in enumerate(values):
+                file.write(",\n" if i else "")
+                file.write(json.dumps(dict(zip(columns, row))))
+            file.write("\n]\n")
+    return path
+
+
+def clear_table(
+    model: type[rx.Model],
+) -> None:
+    with rx.session() as session:
+        session.exec(delete(model))
+        session.commit()
+
+
+def load_one_object_per_row(
+    data_file_path: str,
+    model: type[rx.Model],
+) -> None:
+    if data_file_path.endswith(".csv"):
+        with open(data_file_path, mode="r", newline="", encoding="utf-8") as file:
+            rows = list(csv.DictReader(file))
+    elif data_file_path.endswith(".xlsx"):
+        rows = pd.read_excel(data_file_path).to_dict("records")
+    else:
+        with open(data_file_path, "r") as file:
+            rows = json.load(file)
+    with rx.session() as session:
+        for row in rows:
+            session.add(model(**row))
+        session.commit()
+
+
+def timed(
+    label: str,
+    rows: int,
+    load,
+) -> None:
+    started_at = time.perf_counter()
+    load()
+    elapsed = time.perf_counter() - started_at
+    print(f"  {label:<12} {elapsed:8.2f}s {rows / elapsed:12,.0f} rows/sec")
+
+
+def main(
+    rows: int,
+    chunk_size: int,
+    data_format: str,
+    baseline: bool,
+) -> None:
+    SQLModel.metadata.create_all(rx.model.get_engine())
+    for model in MODELS:
+        path = write_data_file(model, rows, data_format)
+        print(f"{model.__name__}: {rows:,} rows, {len(fields(model))} columns")
+
+        def report_progress(inserted: int) -> None:
+            if inserted % (chunk_size * 100) == 0:
+                print(f"    {inserted:,} rows", flush=True)
+
+        clear_table(model)
+        timed(
+            "bulk",
+            rows,
+            lambda: loading_data(path, model, chunk_size, report_progress),
+        )
+        if baseline:
+            clear_table(model)
+            timed("per row ORM", rows, lambda: load_one_object_per_row(path, model))
+        clear_table(model)
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=BULK_INSERT_CHUNK_SIZE)
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument(
+        "--baseline",
+        action="store_true",
+        help="Also load each file whole, with one ORM object per row",
+    )
+    args = parser.parse_args()
+    main(args.rows, args.chunk_size, args.format, args.baseline)
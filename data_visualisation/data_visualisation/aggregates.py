@@ -0,0 +1,140 @@
+"""Aggregate queries over a model's table, evaluated by the database.
+
+Charts only need a few numbers per group or bin, so these return those
+instead of loading every row. Text columns are cast to numbers for sums,
+averages and bins, and text that isn't a number is left out like NULL. Use the
+typed models to avoid the cast.
+
+    group_by(CerealsTyped, "mfr", "rating", "avg")
+    histogram(CovidTyped, "deaths", bins=20)
+"""
+
+from typing import Any
+
+import reflex as rx
+from sqlalchemy import Float, Integer, case, cast, func, literal_column, select
+from sqlalchemy.sql.elements import ColumnElement
+
+from data_visualisation.schema import column_python_type
+
+# Text that is a decimal number. SQLite would cast any other text to 0. The
+# pysqlite dialect of SQLAlchemy provides REGEXP, other databases have their own.
+NUMBER_PATTERN = r"^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$"
+
+AGGREGATES = {
+    "count": func.count,
+    "sum": func.sum,
+    "avg": func.avg,
+    "min": func.min,
+    "max": func.max,
+}
+
+
+def _column(model: type[rx.Model], name: str) -> ColumnElement:
+    column = model.__table__.columns.get(name)
+    if column is None:
+        raise ValueError(f"{model.__name__} has no column {name!r}")
+    return column
+
+
+def _numeric(column: ColumnElement) -> ColumnElement:
+    if column_python_type(column) in (int, float):
+        return column
+    return case((column.regexp_match(NUMBER_PATTERN), cast(column, Float)))
+
+
+def group_by(
+    model: type[rx.Model],
+    by: str,
+    column: str | None = None,
+    aggregate: str = "count",
+    where: ColumnElement[bool] | None = None,
+) -> list[tuple[Any, Any]]:
+    """(group, value) pairs of an aggregate of a column for each value of `by`.
+
+    `aggregate` is one of count, sum, avg, min or max. Counts don't need a
+    column. Groups are sorted by their value.
+    """
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate {aggregate!r}")
+    key = _column(model, by)
+    if aggregate == "count" and column is None:
+        value = func.count()
+    else:
+        value = AGGREGATES[aggregate](_numeric(_column(model, column)))
+    query = select(key, value).group_by(key).order_by(key)
+    if where is not None:
+        query = query.where(where)
+    with rx.session() as session:
+        return [tuple(row) for row in session.exec(query).all()]
+
+
+def summarize(
+    model: type[rx.Model],
+    column: str,
+    where: ColumnElement[bool] | None = None,
+) -> dict[str, Any]:
+    """The count, sum, avg, min and max of a column, in one query."""
+    value = _numeric(_column(model, column))
+    query = select(
+        *(aggregate(value).label(name) for name, aggregate in AGGREGATES.items())
+    )
+    if where is not None:
+        query = query.where(where)
+    with rx.session() as session:
+        return dict(session.exec(query).one()._mapping)
+
+
+def histogram_bins(
+    low: float,
+    high: float,
+    bins: int,
+) -> tuple[float, float]:
+    """The start and width of `bins` equal width bins from low to high.
+
+    Like NumPy, a column of one value gets bins from half below to half above
+    it, so it falls in the middle bin.
+    """
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return low, (high - low) / bins
+
+
+def histogram(
+    model: type[rx.Model],
+    column: str,
+    bins: int = 10,
+    where: ColumnElement[bool] | None = None,
+) -> list[tuple[float, float, int]]:
+    """(low, high, count) of equal width bins between the min and max values.
+
+    The last bin includes the max value. Empty columns have no bins.
+    """
+    value = _numeric(_column(model, column))
+    with rx.session() as session:
+        bounds = select(func.min(value), func.max(value))
+        if where is not None:
+            bounds = bounds.where(where)
+        low, high = session.exec(bounds).one()
+        if low is None:
+            return []
+        start, width = histogram_bins(low, high, bins)
+        position = (value - start) / width
+        # SQLite truncates when casting to an integer, other databases round.
+        if session.bind.dialect.name == "sqlite":
+            index = cast(position, Integer)
+        else:
+            index = cast(func.floor(position), Integer)
+        index = case((index >= bins, bins - 1), else_=index).label("bin")
+        query = (
+            select(index, func.count())
+            .where(value.is_not(None))
+            .group_by(literal_column("bin"))
+        )
+        if where is not None:
+            query = query.where(where)
+        counts = dict(session.exec(query).all())
+    return [
+        (start + i * width, start + (i + 1) * width, counts.get(i, 0))
+        for i in range(bins)
+    ]
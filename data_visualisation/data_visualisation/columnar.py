@@ -0,0 +1,385 @@
+"""Cached columnar snapshots of model tables, for charts and summaries.
+
+A snapshot holds columns of a table as NumPy arrays, so summaries,
+histograms and group-bys run vectorized instead of over ORM objects. Only the
+columns asked for are loaded, or every column if none are given:
+
+    snapshot(CerealsTyped).group_by("mfr", "rating", "avg")
+    snapshot(Covid, ["deaths"]).histogram("deaths", bins=20)
+
+For number columns they give the same results as the SQL queries of
+`aggregates`, which suit one-off queries with a WHERE clause. The app
+summarizes columns from here.
+
+Each table has a version, bumped by `bump_version` whenever the app adds,
+updates, deletes or loads rows. A snapshot is reloaded when it is older than
+its table, or when it is missing columns asked for. Snapshots of all models
+share `COLUMNAR_CACHE_MB` of memory, the least recently used are dropped
+first. A snapshot that alone would be bigger is refused with a ValueError
+while it loads, before it takes all that memory. Versions are kept per
+process, so changes made by other workers or outside the app are only seen
+after a refresh bumps the version.
+"""
+
+import collections
+import os
+import sys
+import threading
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+import reflex as rx
+from sqlmodel import select
+
+from data_visualisation.aggregates import histogram_bins
+from data_visualisation.schema import column_python_type
+
+COLUMNAR_CACHE_MB = int(os.getenv("COLUMNAR_CACHE_MB", 256))
+# Rows fetched from the database at a time while loading a snapshot
+SNAPSHOT_FETCH_SIZE = int(os.getenv("SNAPSHOT_FETCH_SIZE", 10000))
+
+
+def _to_array(values: list, python_type: type) -> np.ndarray:
+    if python_type is float or (python_type is int and None in values):
+        # Missing numbers are NaN, so integer columns with any become floats
+        return np.array(values, dtype=float)
+    if python_type is int:
+        return np.array(values, dtype=np.int64)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _array_bytes(array: np.ndarray) -> int:
+    if array.dtype != object or not len(array):
+        return array.nbytes
+    # Object arrays only hold pointers, estimate the size of the values too
+    sample = array[:: max(1, len(array) // 1000)]
+    value_bytes = sum(sys.getsizeof(value) for value in sample) / len(sample)
+    return array.nbytes + int(value_bytes * len(array))
+
+
+def _python(value: Any) -> Any:
+    """A NumPy scalar as a python value, with NaN as None like SQL's NULL."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+class ColumnarSnapshot:
+    """The columns of a table at one version, as NumPy arrays."""
+
+    def __init__(
+        self,
+        name: str,
+        version: int,
+        columns: dict[str, np.ndarray],
+        types: dict[str, type],
+    ):
+        self.name = name
+        self.version = version
+        self.columns = columns
+        # The python type of each column, integer columns with missing values
+        # are stored as floats
+        self.types = types
+        self._numeric: dict[str, np.ndarray] = {}
+        self.nbytes = sum(_array_bytes(array) for array in columns.values())
+
+    @classmethod
+    def load(
+        cls,
+        model: type[rx.Model],
+        version: int,
+        columns: Iterable[str] | None = None,
+        max_bytes: int | None = None,
+    ) -> "ColumnarSnapshot":
+        """Load the id and the given columns of a table, or all its columns.
+
+        Raises a ValueError as soon as the rows loaded show the snapshot
+        would be bigger than `max_bytes`.
+        """
+        table = model.__table__
+        if columns is not None:
+            columns = {"id", *columns}
+            if unknown := columns - set(table.columns.keys()):
+                raise ValueError(f"{table.name} has no column {min(unknown)!r}")
+        loaded = [
+            column
+            for column in table.columns
+            if columns is None or column.name in columns
+        ]
+        values: dict[str, list] = {column.name: [] for column in loaded}
+        types = {column.name: column_python_type(column) for column in loaded}
+        row_bytes = None
+        with rx.session() as session:
+            result = session.exec(
+                select(*loaded)
+                .order_by(table.c.id)
+                .execution_options(yield_per=SNAPSHOT_FETCH_SIZE)
+            )
+            for rows in result.partitions():
+                for column_values, column_rows in zip(values.values(), zip(*rows)):
+                    column_values.extend(column_rows)
+                if max_bytes is None:
+                    continue
+                if row_bytes is None:
+                    # Estimated from the first rows, text columns vary
+                    row_bytes = sum(
+                        _array_bytes(_to_array(column_values, types[name]))
+                        for name, column_values in values.items()
+                    ) / len(rows)
+                if row_bytes * len(values["id"]) > max_bytes:
+                    raise ValueError(
+                        f"The columns of {table.name} are too big to keep in "
+                        f"memory, over {max_bytes / 1024 / 1024:,.0f} MB"
+                    )
+        return cls(
+            table.name,
+            version,
+            {
+                name: _to_array(column_values, types[name])
+                for name, column_values in values.items()
+            },
+            types,
+        )
+
+    def __len__(
+        self,
+    ) -> int:
+        return len(self.columns["id"])
+
+    def column(
+        self,
+        name: str,
+    ) -> np.ndarray:
+        if name not in self.columns:
+            raise ValueError(f"{self.name} has no column {name!r}")
+        return self.columns[name]
+
+    def numeric(
+        self,
+        name: str,
+    ) -> np.ndarray:
+        """A column as floats. Text that isn't a number is NaN."""
+        if name not in self._numeric:
+            array = self.column(name)
+            if array.dtype == object:
+                array = pd.to_numeric(pd.Series(array), errors="coerce").to_numpy(float)
+            else:
+                array = array.astype(float, copy=False)
+            self._numeric[name] = array
+            self.nbytes += array.nbytes
+        return self._numeric[name]
+
+    def contains(
+        self,
+        column: str,
+        text: str,
+    ) -> np.ndarray:
+        """A mask of the rows whose value contains the text, ignoring case.
+
+        Values are compared as text, like the app's filter. Missing values
+        never match.
+        """
+        values = pd.Series(self.column(column), dtype=object)
+        present = values[values.notna()]
+        if self.types[column] is int:
+            present = present.map(int)
+        return (
+            present.astype(str)
+            .str.contains(text, case=False, regex=False)
+            .reindex(values.index, fill_value=False)
+            .to_numpy(bool)
+        )
+
+    def _present(
+        self,
+        column: str,
+        mask: np.ndarray | None,
+    ) -> np.ndarray:
+        """The numeric values of a column that aren't missing, within the mask."""
+        values = self.numeric(column)
+        present = ~np.isnan(values)
+        if mask is not None:
+            present &= mask
+        return values[present]
+
+    def summarize(
+        self,
+        column: str,
+        mask: np.ndarray | None = None,
+    ) -> dict[str, Any]:
+        """The count, sum, avg, min and max of a column, within the mask."""
+        values = self._present(column, mask)
+        if not len(values):
+            return {"count": 0, "sum": None, "avg": None, "min": None, "max": None}
+        return {
+            "count": len(values),
+            "sum": _python(values.sum()),
+            "avg": _python(values.mean()),
+            "min": _python(values.min()),
+            "max": _python(values.max()),
+        }
+
+    def histogram(
+        self,
+        column: str,
+        bins: int = 10,
+        mask: np.ndarray | None = None,
+    ) -> list[tuple[float, float, int]]:
+        """(low, high, count) of equal width bins between the min and max values.
+
+        The last bin includes the max value. Empty columns have no bins. Values
+        are binned with the same arithmetic as the SQL histogram.
+        """
+        values = self._present(column, mask)
+        if not len(values):
+            return []
+        start, width = histogram_bins(
+            _python(values.min()), _python(values.max()), bins
+        )
+        index = np.minimum(np.floor((values - start) / width), bins - 1)
+        counts = np.bincount(index.astype(np.int64), minlength=bins)
+        return [
+            (start + i * width, start + (i + 1) * width, _python(counts[i]))
+            for i in range(bins)
+        ]
+
+    def group_by(
+        self,
+        by: str,
+        column: str | None = None,
+        aggregate: str = "count",
+        mask: np.ndarray | None = None,
+    ) -> list[tuple[Any, Any]]:
+        """(group, value) pairs of an aggregate of a column for each value of `by`.
+
+        `aggregate` is one of count, sum, avg, min or max. Counts don't need a
+        column. Groups are sorted by their value. Only rows within the mask
+        are grouped.
+        """
+        if aggregate not in ("count", "sum", "avg", "min", "max"):
+            raise ValueError(f"Unknown aggregate {aggregate!r}")
+        keys = self.column(by)
+        if mask is not None:
+            keys = keys[mask]
+        codes, groups = pd.factorize(keys, sort=True, use_na_sentinel=False)
+        size = len(groups)
+        if aggregate == "count" and column is None:
+            result = np.bincount(codes, minlength=size)
+        else:
+            values = self.numeric(column)
+            if mask is not None:
+                values = values[mask]
+            present = ~np.isnan(values)
+            codes, values = codes[present], values[present]
+            counts = np.bincount(codes, minlength=size)
+            if aggregate == "count":
+                result = counts
+            else:
+                if aggregate in ("sum", "avg"):
+                    result = np.bincount(codes, weights=values, minlength=size)
+                    if aggregate == "avg":
+                        with np.errstate(invalid="ignore", divide="ignore"):
+                            result = result / counts
+                else:
+                    reduce = np.fmin if aggregate == "min" else np.fmax
+                    result = np.full(size, np.nan)
+                    reduce.at(result, codes, values)
+                # Groups without values have no sum, like in SQL
+                result = np.where(counts > 0, result, np.nan)
+        return [
+            (_python(group), _python(value)) for group, value in zip(groups, result)
+        ]
+
+
+class ColumnarCache:
+    """Snapshots of tables, reloaded when stale and evicted least recently used."""
+
+    def __init__(
+        self,
+        max_bytes: int = COLUMNAR_CACHE_MB * 1024 * 1024,
+    ):
+        self.max_bytes = max_bytes
+        self._snapshots: collections.OrderedDict[str, ColumnarSnapshot] = (
+            collections.OrderedDict()
+        )
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def version(
+        self,
+        model: type[rx.Model],
+    ) -> int:
+        return self._versions.get(model.__table__.name, 0)
+
+    def bump_version(
+        self,
+        model: type[rx.Model],
+    ) -> None:
+        name = model.__table__.name
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            # Free the memory now, it would be reloaded anyway
+            self._snapshots.pop(name, None)
+
+    @property
+    def nbytes(
+        self,
+    ) -> int:
+        return sum(snapshot.nbytes for snapshot in self._snapshots.values())
+
+    def get(
+        self,
+        model: type[rx.Model],
+        columns: Iterable[str] | None = None,
+    ) -> ColumnarSnapshot:
+        table = model.__table__
+        name = table.name
+        columns = set(table.columns.keys() if columns is None else columns)
+        # Read before loading, so a change made meanwhile makes it stale
+        version = self.version(model)
+        with self._lock:
+            snapshot = self._snapshots.get(name)
+            if (
+                snapshot is not None
+                and snapshot.version == version
+                and columns <= snapshot.columns.keys()
+            ):
+                self._snapshots.move_to_end(name)
+                return snapshot
+        # Only the columns asked for, so snapshots don't grow with every
+        # column ever summarized
+        snapshot = ColumnarSnapshot.load(model, version, columns, self.max_bytes)
+        with self._lock:
+            self._snapshots[name] = snapshot
+            self._snapshots.move_to_end(name)
+            self._evict()
+        return snapshot
+
+    def _evict(
+        self,
+    ) -> None:
+        # Snapshots only load under the limit, but grow as columns are
+        # converted to numbers. The one just used is dropped last.
+        while self._snapshots and self.nbytes > self.max_bytes:
+            self._snapshots.popitem(last=False)
+
+
+columnar_cache = ColumnarCache()
+
+
+def snapshot(
+    model: type[rx.Model],
+    columns: Iterable[str] | None = None,
+) -> ColumnarSnapshot:
+    """The current columnar snapshot of some columns of a model's table."""
+    return columnar_cache.get(model, columns)
+
+
+def bump_version(model: type[rx.Model]) -> None:
+    """Mark the snapshot of a model's table stale, after changing its rows."""
+    columnar_cache.bump_version(model)
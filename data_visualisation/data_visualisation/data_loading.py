@@ -1,51 +1,195 @@
-import csv
+import itertools
+import os
+import sys
+import time
+from typing import Callable, Iterable, Iterator
+
 import pandas as pd
-import json
 
 import reflex as rx
+from sqlalchemy import insert
+
+from data_visualisation.columnar import bump_version
+from data_visualisation.models import TYPED_MODELS
+from data_visualisation.readers import iter_csv_rows, iter_excel_rows, iter_json_rows
+from data_visualisation.schema import (
+    column_types,
+    convert_value,
+    infer_schema,
+    mismatched_columns,
+    read_sample,
+)
+
+# Rows written per INSERT batch. Larger batches are faster but hold more rows
+# in memory at once.
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", 5000))
+
+# Called with the number of rows written so far, after each batch.
+ProgressCallback = Callable[[int], None]
+
+
+def _chunked(rows: Iterable[dict], chunk_size: int) -> Iterator[list[dict]]:
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
 
 
-def add_csv_data_to_db(data_file_path: str, model: rx.Model):
-    with open(data_file_path, mode="r", newline="", encoding="utf-8") as file:
-        reader = csv.DictReader(
-            file
-        )  # This automatically uses the first row as header names
+def _typed_rows(rows: Iterable[dict], model: type[rx.Model]) -> Iterable[dict]:
+    """Convert the values of the non-text columns to their python types."""
+    converted = {
+        column: python_type
+        for column, python_type in column_types(model).items()
+        if python_type is not str
+    }
+    if not converted:
+        return rows
+    return (
+        {
+            **row,
+            **{
+                column: convert_value(row[column], python_type)
+                for column, python_type in converted.items()
+                if column in row
+            },
+        }
+        for row in rows
+    )
 
-        with rx.session() as session:
-            for row in reader:
-                # Create an instance of Model using dictionary unpacking
-                item = model(**row)
-                session.add(item)
-            session.commit()
 
+def bulk_insert_rows(
+    rows: Iterable[dict],
+    model: type[rx.Model],
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+    progress: ProgressCallback | None = None,
+) -> int:
+    """Insert rows of column values into the table of a model, in batches.
 
-def add_pandas_data_to_db(df: pd.DataFrame, model: rx.Model):
+    Each batch is a single Core INSERT executed with many parameter sets, so
+    no ORM object is created per row. All batches are committed together.
+    Values of number and date columns are converted from text.
+    Returns the number of rows inserted.
+    """
+    statement = insert(model.__table__)
+    inserted = 0
     with rx.session() as session:
-        for index, row in df.iterrows():
-            data_tuple = row.to_dict()
-            # Create an instance of Model using dictionary unpacking
-            item = model(**data_tuple)
-            session.add(item)
+        for chunk in _chunked(_typed_rows(rows, model), chunk_size):
+            session.execute(statement, chunk)
+            inserted += len(chunk)
+            if progress is not None:
+                progress(inserted)
         session.commit()
+    bump_version(model)
+    return inserted
+
+
+def _dataframe_rows(df: pd.DataFrame, chunk_size: int) -> Iterator[dict]:
+    # Convert a chunk at a time, so the whole frame is never duplicated as
+    # dicts. Missing values are stored as NULL rather than NaN.
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start : start + chunk_size]
+        yield from chunk.astype(object).where(chunk.notna(), None).to_dict("records")
+
+
+def add_csv_data_to_db(
+    data_file_path: str,
+    model: rx.Model,
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+    progress: ProgressCallback | None = None,
+) -> int:
+    return bulk_insert_rows(iter_csv_rows(data_file_path), model, chunk_size, progress)
+
+
+def add_excel_data_to_db(
+    data_file_path: str,
+    model: rx.Model,
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+    progress: ProgressCallback | None = None,
+) -> int:
+    return bulk_insert_rows(
+        iter_excel_rows(data_file_path), model, chunk_size, progress
+    )
 
 
-def loading_data(data_file_path: str, model: rx.Model):
+def add_json_data_to_db(
+    data_file_path: str,
+    model: rx.Model,
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+    progress: ProgressCallback | None = None,
+) -> int:
+    return bulk_insert_rows(iter_json_rows(data_file_path), model, chunk_size, progress)
+
+
+def add_pandas_data_to_db(
+    df: pd.DataFrame,
+    model: rx.Model,
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+    progress: ProgressCallback | None = None,
+) -> int:
+    return bulk_insert_rows(
+        _dataframe_rows(df, chunk_size), model, chunk_size, progress
+    )
+
+
+def peak_rss_mb() -> float | None:
+    """The peak resident memory of the process, where it can be measured."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def loading_data(
+    data_file_path: str,
+    model: rx.Model,
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+    progress: ProgressCallback | None = None,
+):
     try:
+        if mismatched := mismatched_columns(
+            model, infer_schema(read_sample(data_file_path))
+        ):
+            columns = ", ".join(
+                f"{column} ({python_type.__name__})"
+                for column, python_type in mismatched.items()
+            )
+            typed_model = TYPED_MODELS.get(model)
+            print(
+                f"{model.__name__} stores these columns as text, but they look "
+                f"like numbers or dates: {columns}. "
+                + (
+                    f"Use {typed_model.__name__} to sort and aggregate them as such."
+                    if typed_model is not None
+                    else "Use a typed model to sort and aggregate them as such, "
+                    "see `python -m data_visualisation.schema`."
+                )
+            )
+
+        # Files are streamed into the database in batches, never fully read
+        started_at = time.perf_counter()
+        rows = 0
+
         if data_file_path.endswith(".csv"):
             # Open your CSV file
-            add_csv_data_to_db(data_file_path, model)
+            rows = add_csv_data_to_db(data_file_path, model, chunk_size, progress)
 
         if data_file_path.endswith(".xlsx"):
             # Open your excel file
-            df = pd.read_excel(data_file_path)
-            add_pandas_data_to_db(df, model)
+            rows = add_excel_data_to_db(data_file_path, model, chunk_size, progress)
 
         if data_file_path.endswith(".json"):
             # Open your json file
-            with open(data_file_path, "r") as file:
-                data = json.load(file)
-                df = pd.DataFrame(data)
-                add_pandas_data_to_db(df, model)
+            rows = add_json_data_to_db(data_file_path, model, chunk_size, progress)
+
+        elapsed = time.perf_counter() - started_at
+        peak_rss = peak_rss_mb()
+        print(
+            f"Loaded {rows:,} rows into {model.__name__} in {elapsed:.1f}s "
+            f"({rows / elapsed:,.0f} rows/sec"
+            + (f", peak RSS {peak_rss:,.0f} MB)" if peak_rss is not None else ")")
+        )
 
     except Exception as e:
         print(
@@ -1,14 +1,64 @@
 """Welcome to Reflex! This file outlines the steps to create a basic app."""
 
-from sqlmodel import select
+import asyncio
+import bisect
+
+from sqlalchemy import String, cast, delete, insert, update
+from sqlmodel import func, select
 import reflex as rx
 
-from data_visualisation.models import Customer, Cereals, Covid, Countries  # noqa: F401
+from data_visualisation.models import (  # noqa: F401
+    Customer,
+    Cereals,
+    Covid,
+    Countries,
+    CerealsTyped,
+    CovidTyped,
+    CountriesTyped,
+)
+from data_visualisation.columnar import bump_version, snapshot
 from data_visualisation.data_loading import loading_data
+from data_visualisation.schema import column_python_type, column_types, convert_value
 
 
-MODEL = Covid
+# The typed model, so numbers sort and summarize as numbers
+MODEL = CovidTyped
 data_file_path = "data_sources/covid_data.xlsx"
+# Items shown per page, only the current page is loaded from the database
+PAGE_SIZE = 20
+# Bins of the histogram of the summarized column
+SUMMARY_BINS = 10
+
+
+def summarize_column(
+    column: str,
+    filter_column: str | None,
+    filter_value: str,
+) -> tuple[str, list[dict]]:
+    """The summary and histogram of a column, over the rows matching a filter.
+
+    Only the summarized and filtered columns of the table's columnar snapshot
+    are loaded.
+    """
+    try:
+        data = snapshot(MODEL, [column, *([filter_column] if filter_column else [])])
+    except ValueError as e:
+        return str(e), []
+    mask = None
+    if filter_column:
+        mask = data.contains(filter_column, filter_value)
+    stats = data.summarize(column, mask)
+    if not stats["count"]:
+        return f"{column} has no numbers", []
+    summary = (
+        f"{column}: {stats['count']:,} values, "
+        f"avg {stats['avg']:,.2f}, min {stats['min']:,}, max {stats['max']:,}"
+    )
+    histogram = [
+        {"bin": f"{low:,.4g} to {high:,.4g}", "count": count}
+        for low, high, count in data.histogram(column, SUMMARY_BINS, mask)
+    ]
+    return summary, histogram
 
 
 class State(rx.State):
@@ -16,8 +66,23 @@ class State(rx.State):
 
     items: list[MODEL] = []
     sort_value: str = ""
+    filter_column: str = ""
+    filter_value: str = ""
+    page: int = 0
     num_items: int
     current_item: MODEL = MODEL()
+    # Number of matching rows for each filter, kept until the next refresh
+    _row_counts: dict[str, int] = {}
+    # Column summarized below the header, over the filtered items
+    summary_column: str = ""
+    summary: str = ""
+    histogram: list[dict] = []
+    # Bumped by each summary, so only the latest one is shown
+    _summary_request: int = 0
+
+    @rx.var
+    def num_pages(self) -> int:
+        return max(1, -(-self.num_items // PAGE_SIZE))
 
     def handle_add_submit(self, form_data: dict):
         """Handle the form submit."""
@@ -27,59 +92,243 @@ class State(rx.State):
         """Handle the form submit."""
         self.current_item.update(form_data)
 
-    def load_entries(self) -> list[MODEL]:
-        """Get all items from the database."""
-        with rx.session() as session:
-            self.items = session.exec(select(MODEL)).all()
-            self.num_items = len(self.items)
+    def _filter_clause(self):
+        """The WHERE clause of the column filter, or None if there is none."""
+        column = MODEL.__table__.columns.get(self.filter_column)
+        if column is None or not self.filter_value:
+            return None
+        if column_python_type(column) is not str:
+            column = cast(column, String)
+        return column.icontains(self.filter_value, autoescape=True)
+
+    def _filter_key(self) -> str:
+        if self._filter_clause() is None:
+            return ""
+        return f"{self.filter_column}:{self.filter_value}"
+
+    def _matches_filter(self, item: dict) -> bool:
+        """Whether an item would be kept by the column filter."""
+        if self._filter_clause() is None:
+            return True
+        value = str(item.get(self.filter_column, ""))
+        return self.filter_value.lower() in value.lower()
+
+    def _column_values(self, item: dict) -> dict:
+        """The values of an item's columns, as their python types."""
+        return {
+            column: item[column]
+            if python_type is str
+            else convert_value(item[column], python_type)
+            for column, python_type in column_types(MODEL).items()
+            if column in item
+        }
+
+    def _items_query(self):
+        """The query of the filtered items, in the order of the pages."""
+        query = select(MODEL)
+        if (filter_clause := self._filter_clause()) is not None:
+            query = query.where(filter_clause)
+
+        # The id breaks ties, so rows don't move between pages
+        order_by = [MODEL.id]
+        sort_column = MODEL.__table__.columns.get(self.sort_value)
+        if sort_column is not None:
+            order_by.insert(0, sort_column)
+        return query.order_by(*order_by)
+
+    def load_entries(self):
+        """Get the current page of items from the database."""
+        count_query = select(func.count()).select_from(MODEL)
+        if (filter_clause := self._filter_clause()) is not None:
+            count_query = count_query.where(filter_clause)
 
-            if self.sort_value:
-                self.items = sorted(
-                    self.items,
-                    key=lambda item: getattr(item, self.sort_value),
-                )
+        with rx.session() as session:
+            filter_key = self._filter_key()
+            if filter_key not in self._row_counts:
+                self._row_counts[filter_key] = session.exec(count_query).one()
+            self.num_items = self._row_counts[filter_key]
+            # Stay on the last page when items were deleted or filtered out
+            last_page = max(0, (self.num_items - 1) // PAGE_SIZE)
+            self.page = min(self.page, last_page)
+            self.items = session.exec(
+                self._items_query().offset(self.page * PAGE_SIZE).limit(PAGE_SIZE)
+            ).all()
+
+    @rx.event(background=True)
+    async def load_summary(self):
+        """Summarize the chosen column from the table's columnar snapshot.
+
+        Loading the snapshot after a change takes seconds on large tables, so
+        it runs in a thread, without holding the state lock.
+        """
+        async with self:
+            self._summary_request += 1
+            request = self._summary_request
+            column = self.summary_column
+            filter_column = (
+                self.filter_column if self._filter_clause() is not None else None
+            )
+            filter_value = self.filter_value
+        summary, histogram = "", []
+        if column:
+            summary, histogram = await asyncio.to_thread(
+                summarize_column, column, filter_column, filter_value
+            )
+        async with self:
+            if request == self._summary_request:
+                self.summary, self.histogram = summary, histogram
+
+    def set_summary_column(self, summary_column: str):
+        self.summary_column = summary_column
+        return State.load_summary
 
     def sort_values(self, sort_value: str):
         self.sort_value = sort_value
+        self.page = 0
+        self.load_entries()
+
+    def set_filter_column(self, filter_column: str):
+        self.filter_column = filter_column
+        self.page = 0
         self.load_entries()
+        return State.load_summary
+
+    def set_filter_value(self, filter_value: str):
+        self.filter_value = filter_value
+        self.page = 0
+        self.load_entries()
+        return State.load_summary
+
+    def previous_page(self):
+        if self.page > 0:
+            self.page -= 1
+            self.load_entries()
+
+    def next_page(self):
+        if (self.page + 1) * PAGE_SIZE < self.num_items:
+            self.page += 1
+            self.load_entries()
 
     def get_item(self, item: MODEL):
         self.current_item = item
 
+    def _sort_key(self, item: MODEL) -> tuple:
+        """The position of an item in the order of the pages."""
+        sort_column = MODEL.__table__.columns.get(self.sort_value)
+        if sort_column is None:
+            return (item.id,)
+        value = getattr(item, sort_column.name)
+        # NULL sorts first, like in SQLite
+        return (value is not None, value, item.id)
+
+    def _fill_page(self):
+        """Load the items that moved up onto the current page, in one query."""
+        if not self.items and self.page > 0:
+            # Load the page before once the last item of a page is gone
+            self.load_entries()
+            return
+        missing = PAGE_SIZE - len(self.items)
+        offset = self.page * PAGE_SIZE + len(self.items)
+        if missing <= 0 or offset >= self.num_items:
+            return
+        with rx.session() as session:
+            self.items = (
+                self.items
+                + session.exec(self._items_query().offset(offset).limit(missing)).all()
+            )
+
+    def _place_on_page(self, item: MODEL):
+        """Show an item added or changed in the database, in sort order.
+
+        The item must not be on the page already, and the row count must
+        include it.
+        """
+        keys = [self._sort_key(page_item) for page_item in self.items]
+        index = bisect.bisect_right(keys, self._sort_key(item))
+        if index == 0 and self.page > 0:
+            # It may belong on an earlier page, which then pushes its last
+            # item onto this one
+            self.load_entries()
+        elif index < len(self.items):
+            self.items.insert(index, item)
+            # The last item moves on to the next page
+            del self.items[PAGE_SIZE:]
+        else:
+            # It goes after the page's items, either next on a page that
+            # isn't full or on a later page
+            self._fill_page()
+
+    def _set_row_count(self, change: int):
+        """Adjust the count of the current filter, other counts are dropped."""
+        self.num_items += change
+        self._row_counts = {self._filter_key(): self.num_items}
+
     def add_item(self):
         """Add an item to the database."""
+        try:
+            values = self._column_values(self.current_item)
+        except ValueError as e:
+            return rx.window_alert(f"Invalid value: {e}")
         with rx.session() as session:
             ## If need unique items on a certain column type add in a check to see if a item has already been added
             # if session.exec(
             #     select(MODEL).where(MODEL.email == self.current_item["email"])
             # ).first():
             #     return rx.window_alert("Item already exists!!!")
-            session.add(MODEL(**self.current_item))
+            item_id = session.exec(
+                insert(MODEL).values(**values).returning(MODEL.id)
+            ).scalar_one()
             session.commit()
-        self.load_entries()
-        return rx.window_alert("Item has been added.")
+        bump_version(MODEL)
+        # Show the new item on the current page, rather than reloading it
+        matches_filter = self._matches_filter(values)
+        self._set_row_count(1 if matches_filter else 0)
+        if matches_filter:
+            self._place_on_page(MODEL(id=item_id, **values))
+        return [State.load_summary, rx.window_alert("Item has been added.")]
 
     def update_item(self):
         """Update an item in the database."""
+        try:
+            values = self._column_values(self.current_item)
+        except ValueError as e:
+            return rx.window_alert(f"Invalid value: {e}")
+        item_id = self.current_item["id"]
         with rx.session() as session:
-            item = session.exec(
-                select(MODEL).where(MODEL.id == self.current_item["id"])
-            ).first()
-
-            for field in MODEL.__fields__:
-                if field != "id":
-                    setattr(item, field, self.current_item[field])
-            session.add(item)
+            session.exec(update(MODEL).where(MODEL.id == item_id).values(**values))
             session.commit()
-        self.load_entries()
+        bump_version(MODEL)
+        # The item is placed again, as the change may move it in the sort
+        # order or out of the filter
+        self.items = [item for item in self.items if item.id != item_id]
+        if self._matches_filter(values):
+            self._place_on_page(MODEL(id=item_id, **values))
+        else:
+            self._set_row_count(-1)
+            self._fill_page()
+        return State.load_summary
 
     def delete_item(self, id: int):
         """Delete an item from the database."""
         with rx.session() as session:
-            item = session.exec(select(MODEL).where(MODEL.id == id)).first()
-            session.delete(item)
+            deleted = session.exec(delete(MODEL).where(MODEL.id == id)).rowcount
             session.commit()
+        bump_version(MODEL)
+        self.items = [item for item in self.items if item.id != id]
+        self._set_row_count(-deleted)
+        self._fill_page()
+        return State.load_summary
+
+    def _reload(self):
+        """Count and load the items again, and summarize them."""
+        self._row_counts = {}
         self.load_entries()
+        return State.load_summary
+
+    def refresh(self):
+        """Reload the items and snapshot, to see changes made elsewhere."""
+        bump_version(MODEL)
+        return self._reload()
 
     def on_load(self):
         # Check if the database is empty
@@ -90,7 +339,8 @@ class State(rx.State):
             if first_entry is None and data_file_path != "":
                 loading_data(data_file_path, MODEL)
 
-        self.load_entries()
+        # The snapshot is kept, it is only stale after a write or a refresh
+        return self._reload()
 
 
 def add_fields(field):
@@ -121,9 +371,10 @@ def update_fields_and_attrs(field, attr):
             weight="bold",
         ),
         rx.input(
-            placeholder=attr,
+            # Typed models have number columns, the input shows them as text
+            placeholder=attr.to(str),
             name=field,
-            default_value=attr,
+            default_value=attr.to(str),
         ),
         direction="column",
         spacing="2",
@@ -307,6 +558,77 @@ def show_item(item: MODEL):
     )
 
 
+def filter_items():
+    return rx.hstack(
+        rx.select(
+            [*[field for field in MODEL.__fields__ if field != "id"]],
+            placeholder="Filter By",
+            size="3",
+            on_change=State.set_filter_column,
+            font_family="Inter",
+        ),
+        rx.debounce_input(
+            rx.input(
+                placeholder="Contains...",
+                size="3",
+                on_change=State.set_filter_value,
+            ),
+            debounce_timeout=300,
+        ),
+        spacing="3",
+    )
+
+
+def pagination():
+    return rx.hstack(
+        rx.button(
+            rx.icon("chevron_left"),
+            on_click=State.previous_page,
+            disabled=State.page == 0,
+            variant="soft",
+        ),
+        rx.text(
+            f"Page {State.page + 1} of {State.num_pages}",
+            font_family="Inter",
+        ),
+        rx.button(
+            rx.icon("chevron_right"),
+            on_click=State.next_page,
+            disabled=State.page + 1 >= State.num_pages,
+            variant="soft",
+        ),
+        align="center",
+        justify="end",
+        width="100%",
+        padding_x="2em",
+        padding_y="1em",
+    )
+
+
+def summary_panel():
+    """The summary and histogram of the chosen column."""
+    return rx.cond(
+        State.summary != "",
+        rx.vstack(
+            rx.text(State.summary, font_family="Inter"),
+            rx.cond(
+                State.histogram.length() > 0,
+                rx.recharts.bar_chart(
+                    rx.recharts.bar(data_key="count", fill=rx.color("grass", 9)),
+                    rx.recharts.x_axis(data_key="bin"),
+                    rx.recharts.y_axis(),
+                    rx.recharts.graphing_tooltip(),
+                    data=State.histogram,
+                    width="100%",
+                    height=200,
+                ),
+            ),
+            width="100%",
+            padding_x="2em",
+        ),
+    )
+
+
 def content():
     return rx.fragment(
         rx.vstack(
@@ -317,7 +639,13 @@ def content():
                     size="5",
                     font_family="Inter",
                 ),
+                rx.icon_button(
+                    rx.icon("refresh_cw"),
+                    on_click=State.refresh,
+                    variant="soft",
+                ),
                 rx.spacer(),
+                filter_items(),
                 rx.select(
                     [*[field for field in MODEL.__fields__ if field != "id"]],
                     placeholder="Sort By: Name",
@@ -325,11 +653,19 @@ def content():
                     on_change=lambda sort_value: State.sort_values(sort_value),
                     font_family="Inter",
                 ),
+                rx.select(
+                    [*[field for field in MODEL.__fields__ if field != "id"]],
+                    placeholder="Summarize",
+                    size="3",
+                    on_change=State.set_summary_column,
+                    font_family="Inter",
+                ),
                 width="100%",
                 padding_x="2em",
                 padding_top="2em",
                 padding_bottom="1em",
             ),
+            summary_panel(),
             rx.table.root(
                 rx.table.header(
                     rx.table.row(
@@ -347,6 +683,7 @@ def content():
                 size="3",
                 width="100%",
             ),
+            pagination(),
         ),
     )
 
@@ -70,3 +70,78 @@ class Countries(rx.Model, table=True):
     density: str
     densityMi: str
     rank: str
+
+
+# Typed variants of the models above, generated from their data files with
+# `python -m data_visualisation.schema`. Numbers are stored as numbers, so they
+# sort numerically and can be aggregated in SQL.
+
+
+class CerealsTyped(rx.Model, table=True):
+    """The cereal model, with typed columns."""
+
+    name: str
+    mfr: str
+    type: str
+    calories: int
+    protein: int
+    fat: int
+    sodium: int
+    fiber: float
+    carbo: float
+    sugars: int
+    potass: int
+    vitamins: int
+    shelf: int
+    weight: float
+    cups: float
+    rating: float
+
+
+class CovidTyped(rx.Model, table=True):
+    """The covid model, with typed columns."""
+
+    state: str
+    zone: str
+    total_cases: int
+    active: int
+    discharged: int
+    deaths: int
+    active_ratio: float
+    discharge_ratio: float
+    discharge_avg: str
+    death_ratio: float
+    death_avg: str
+    population: int
+
+
+class CountriesTyped(rx.Model, table=True):
+    """The countries model, with typed columns."""
+
+    place: int
+    pop1980: float
+    pop2000: float
+    pop2010: float
+    pop2022: float
+    pop2023: float
+    pop2030: float
+    pop2050: float
+    country: str
+    area: float
+    landAreaKm: float
+    cca2: str
+    cca3: str
+    netChange: float | None = None
+    growthRate: float
+    worldPercentage: float | None = None
+    density: float
+    densityMi: float
+    rank: int
+
+
+# The typed variant of each text model, suggested when loading data into one.
+TYPED_MODELS = {
+    Cereals: CerealsTyped,
+    Covid: CovidTyped,
+    Countries: CountriesTyped,
+}
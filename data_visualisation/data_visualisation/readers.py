@@ -0,0 +1,90 @@
+"""Readers that stream the rows of data files as dicts of column values.
+
+Rows are read one at a time, so a file never has to fit in memory: CSV
+files through `csv.DictReader`, Excel files through openpyxl's read-only
+mode and JSON arrays of objects through an incremental parser.
+"""
+
+import csv
+import json
+import os
+from typing import Iterator
+
+import openpyxl
+
+# Characters of a JSON file read at a time. An object bigger than this is
+# parsed once more for each extra read it needs.
+JSON_READ_SIZE = int(os.getenv("JSON_READ_SIZE", 1 << 16))
+
+_JSON_SEPARATORS = " \t\r\n,"
+
+
+def iter_csv_rows(data_file_path: str) -> Iterator[dict]:
+    with open(data_file_path, mode="r", newline="", encoding="utf-8") as file:
+        # This automatically uses the first row as header names
+        yield from csv.DictReader(file)
+
+
+def iter_excel_rows(data_file_path: str) -> Iterator[dict]:
+    """Rows of the active sheet, with the first row as header names."""
+    workbook = openpyxl.load_workbook(data_file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        for values in rows:
+            # Formatted but empty rows are read too, skip them
+            if all(value is None for value in values):
+                continue
+            yield {
+                column: value
+                for column, value in zip(header, values)
+                if column is not None
+            }
+    finally:
+        workbook.close()
+
+
+def iter_json_rows(
+    data_file_path: str,
+    read_size: int = JSON_READ_SIZE,
+) -> Iterator[dict]:
+    """Objects of a JSON file holding one array, parsed as the file is read."""
+    decoder = json.JSONDecoder()
+    with open(data_file_path, "r", encoding="utf-8") as file:
+        buffer = ""
+        while not buffer and (more := file.read(read_size)):
+            buffer = more.lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{data_file_path} doesn't hold a JSON array")
+        position = 1
+        while True:
+            while position < len(buffer) and buffer[position] in _JSON_SEPARATORS:
+                position += 1
+            if buffer.startswith("]", position):
+                return
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The next object continues past the buffer, read more of it
+                more = file.read(read_size)
+                if not more:
+                    raise
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            if not isinstance(row, dict):
+                raise ValueError(f"{data_file_path} holds a {type(row).__name__}")
+            yield row
+
+
+def iter_rows(data_file_path: str) -> Iterator[dict]:
+    """Rows of a csv, xlsx or json data file."""
+    if data_file_path.endswith(".csv"):
+        return iter_csv_rows(data_file_path)
+    if data_file_path.endswith(".xlsx"):
+        return iter_excel_rows(data_file_path)
+    if data_file_path.endswith(".json"):
+        return iter_json_rows(data_file_path)
+    raise ValueError(f"Unsupported data file type: {data_file_path}")
@@ -0,0 +1,160 @@
+"""Column type inference for data files.
+
+The type of each column is inferred from a sample of the rows: `int`, `float`
+or `date` (ISO format) if every non-empty value in the sample parses as one,
+`str` otherwise. Columns with empty values in the sample are nullable.
+
+Run it on a data file to print a typed model for it, to add to `models.py`:
+
+    python -m data_visualisation.schema data_sources/cereal.csv CerealsTyped
+"""
+
+import contextlib
+import datetime
+import itertools
+import os
+import sys
+from typing import Any, Iterable
+
+import reflex as rx
+from sqlalchemy import TypeDecorator
+from sqlalchemy.sql.elements import ColumnElement
+
+from data_visualisation.readers import iter_rows
+
+SCHEMA_SAMPLE_SIZE = int(os.getenv("SCHEMA_SAMPLE_SIZE", 1000))
+
+
+# Strict parsers of text values, so "0.5" isn't taken for an int
+_PARSERS = {
+    int: int,
+    float: float,
+    datetime.date: datetime.date.fromisoformat,
+}
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or (isinstance(value, float) and value != value)
+
+
+def _parses_as(value: Any, python_type: type) -> bool:
+    if python_type is int:
+        if isinstance(value, bool):
+            return False
+        if isinstance(value, float):
+            return value.is_integer()
+        if isinstance(value, int):
+            return True
+    if python_type is float and isinstance(value, (int, float)):
+        return not isinstance(value, bool)
+    if python_type is datetime.date and isinstance(value, datetime.date):
+        return True
+    if not isinstance(value, str):
+        return False
+    try:
+        _PARSERS[python_type](value.strip())
+    except ValueError:
+        return False
+    return True
+
+
+def infer_type(values: Iterable[Any]) -> tuple[type, bool]:
+    """The narrowest type all values parse as, and whether any are empty."""
+    values = list(values)
+    present = [value for value in values if not _is_empty(value)]
+    nullable = len(present) < len(values)
+    if not present:
+        return str, True
+    for python_type in (int, float, datetime.date):
+        if all(_parses_as(value, python_type) for value in present):
+            return python_type, nullable
+    return str, nullable
+
+
+def infer_schema(rows: list[dict]) -> dict[str, tuple[type, bool]]:
+    """The type and nullability of each column of sample rows."""
+    columns = dict.fromkeys(key for row in rows for key in row)
+    return {column: infer_type(row.get(column) for row in rows) for column in columns}
+
+
+def read_sample(
+    data_file_path: str,
+    size: int = SCHEMA_SAMPLE_SIZE,
+) -> list[dict]:
+    """The first rows of a csv, xlsx or json data file."""
+    with contextlib.closing(iter_rows(data_file_path)) as rows:
+        return list(itertools.islice(rows, size))
+
+
+def convert_value(value: Any, python_type: type) -> Any:
+    """Convert a loaded value to the python type of its column."""
+    if _is_empty(value):
+        return None
+    if python_type is int:
+        return value if isinstance(value, int) else int(float(value))
+    if python_type is float:
+        return float(value)
+    if python_type is datetime.date:
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        if isinstance(value, datetime.date):
+            return value
+        return datetime.date.fromisoformat(str(value))
+    return value
+
+
+def column_python_type(column: ColumnElement) -> type:
+    """The python type of a column's values."""
+    column_type = column.type
+    # Text columns of models are sqlmodel's AutoString, which wraps String.
+    if isinstance(column_type, TypeDecorator):
+        column_type = column_type.impl_instance
+    return column_type.python_type
+
+
+def column_types(model: type[rx.Model]) -> dict[str, type]:
+    """The python type of each column of a model's table, except the id."""
+    return {
+        column.name: column_python_type(column)
+        for column in model.__table__.columns
+        if column.name != "id"
+    }
+
+
+def mismatched_columns(
+    model: type[rx.Model],
+    schema: dict[str, tuple[type, bool]],
+) -> dict[str, type]:
+    """Text columns of a model whose sample values are all numbers or dates."""
+    return {
+        column: schema[column][0]
+        for column, python_type in column_types(model).items()
+        if python_type is str and schema.get(column, (str,))[0] is not str
+    }
+
+
+def model_source(
+    name: str,
+    schema: dict[str, tuple[type, bool]],
+) -> str:
+    """The source of a model class with the inferred column types."""
+    lines = [
+        f"class {name}(rx.Model, table=True):",
+        f'    """The {name} model."""',
+        "",
+    ]
+    for column, (python_type, nullable) in schema.items():
+        type_name = (
+            "datetime.date" if python_type is datetime.date else python_type.__name__
+        )
+        lines.append(
+            f"    {column}: {type_name} | None = None"
+            if nullable
+            else f"    {column}: {type_name}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    data_file_path, name = sys.argv[1:3]
+    print(model_source(name, infer_schema(read_sample(data_file_path))))
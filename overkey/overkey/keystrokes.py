@@ -0,0 +1,89 @@
+"""Keystroke timing analysis for verifying typing test results.
+
+The client records the time between keystrokes in milliseconds, encoded as
+unsigned LEB128 varints, and sends the whole recording once, together with the
+score. It is analyzed once, when the test is over, off the event loop.
+"""
+
+import base64
+import dataclasses
+
+import numpy as np
+
+MAX_RECORDING_BYTES = 64 * 1024  # Upper bound on the varints kept per test
+MIN_HUMAN_INTERVAL_MS = 10  # Keystrokes faster than this look scripted
+MAX_FAST_FRACTION = 0.05  # Share of such keystrokes tolerated (key rollover)
+BURST_STDDEVS = 2  # Seconds this far above the mean WPM count as bursts
+
+
+@dataclasses.dataclass
+class KeystrokeStats:
+    """Statistics of the keystrokes recorded during a test."""
+
+    keystrokes: int
+    peak_wpm: float
+    consistency: float
+    bursts: int
+    median_interval_ms: float
+    verified: bool
+
+
+def decode_recording(recording: str) -> bytes:
+    """The varints of a base64 encoded recording, capped at the maximum size.
+
+    Anything that isn't valid base64 wasn't sent by the recorder and counts as
+    an empty recording.
+    """
+    # The recorder never sends much more than the cap, don't decode more.
+    if len(recording) > 2 * MAX_RECORDING_BYTES:
+        return b""
+    try:
+        return base64.b64decode(recording, validate=True)[:MAX_RECORDING_BYTES]
+    except ValueError:
+        # Invalid base64 (binascii.Error) or non-ASCII text
+        return b""
+
+
+def decode_varints(data: bytes) -> np.ndarray:
+    """Decode a buffer of unsigned LEB128 varints, ignoring a truncated tail."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero((raw & 0x80) == 0)
+    if not len(ends):
+        return np.zeros(0, dtype=np.int64)
+    raw = raw[: ends[-1] + 1]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    shifts = 7 * (np.arange(len(raw)) - np.repeat(starts, lengths))
+    return np.add.reduceat((raw & 0x7F).astype(np.int64) << shifts, starts)
+
+
+def analyze_keystrokes(
+    data: bytes, time_limit: int, correct_letters: int
+) -> KeystrokeStats:
+    """Compute per-second WPM, bursts and consistency from a recording.
+
+    The result is only verified if there are at least as many keystrokes as
+    correct letters and almost no keystrokes came faster than a human types.
+    """
+    intervals = decode_varints(data)
+    seconds = np.cumsum(intervals) // 1000
+    keys_per_second = np.bincount(seconds[seconds < time_limit], minlength=time_limit)
+    wpm_per_second = keys_per_second * 60 / 5
+
+    mean, std = wpm_per_second.mean(), wpm_per_second.std()
+    # The first interval is measured from the start of the test.
+    typing_intervals = intervals[1:]
+    return KeystrokeStats(
+        keystrokes=len(intervals),
+        peak_wpm=float(wpm_per_second.max(initial=0)),
+        consistency=float(max(0, 1 - std / mean)) if mean else 0.0,
+        bursts=int((wpm_per_second > mean + BURST_STDDEVS * std).sum()),
+        median_interval_ms=(
+            float(np.median(typing_intervals)) if len(typing_intervals) else 0.0
+        ),
+        verified=bool(
+            len(intervals) >= correct_letters
+            and (typing_intervals < MIN_HUMAN_INTERVAL_MS).sum()
+            <= MAX_FAST_FRACTION * len(typing_intervals)
+        ),
+    )
@@ -1,16 +1,28 @@
 """Welcome to Reflex! This file outlines the steps to create a basic app."""
 
+import array
 import asyncio
 import dataclasses
 import enum
+import functools
 import random
-from pathlib import Path
+import time
 
 import reflex as rx
 from reflex.experimental.client_state import ClientStateVar
+from reflex.utils.imports import ImportDict
+from reflex.vars import VarData
 from reflex.vars.number import NumberVar
 from reflex.vars.sequence import StringVar
 
+from .keystrokes import (
+    MAX_RECORDING_BYTES,
+    KeystrokeStats,
+    analyze_keystrokes,
+    decode_recording,
+)
+from .word_bundle import WORD_LISTS_DIR, open_bundle
+
 
 @dataclasses.dataclass(frozen=True)
 class LanguageOption:
@@ -20,6 +32,11 @@ class LanguageOption:
     name: str
     is_advanced: bool
 
+    @property
+    def file_name(self) -> str:
+        """The name of the word list for this language option."""
+        return f"{self.code}{'_advanced' if self.is_advanced else ''}"
+
 
 language_options = [
     LanguageOption("bg", "български", False),
@@ -50,23 +67,60 @@ language_options = [
 english_language_option = LanguageOption("en", "English", False)
 
 
+@dataclasses.dataclass(frozen=True)
+class WordPool:
+    """The words of a language as one UTF-8 blob plus word offsets.
+
+    Word `i` is `blob[offsets[i]:offsets[i + 1]]`. Pools read from the word
+    bundle are views into its memory mapping, so they cost no I/O or copying.
+    """
+
+    blob: bytes | memoryview
+    offsets: array.array | memoryview
+
+    @classmethod
+    def from_words(cls, words: list[str]) -> "WordPool":
+        """Build a pool from a list of words."""
+        encoded_words = [word.encode() for word in words]
+        offsets = array.array("I", [0])
+        for word in encoded_words:
+            offsets.append(offsets[-1] + len(word))
+        return cls(b"".join(encoded_words), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def sample(self, count: int) -> list[str]:
+        """Sample `count` words with replacement."""
+        blob, offsets = self.blob, self.offsets
+        return [
+            str(blob[offsets[i] : offsets[i + 1]], "utf-8")
+            for i in random.choices(range(len(self)), k=count)
+        ]
+
+
+# Memory-mapped once per worker at startup.
+word_bundle = open_bundle()
+
+
 def load_language(language_option: LanguageOption) -> list[str]:
     """Load the word list for the given language option."""
     return (
-        Path(
-            f"word_lists/{language_option.code}{'_advanced' if language_option.is_advanced else ''}.txt"
-        )
-        .read_text()
-        .splitlines()
+        (WORD_LISTS_DIR / f"{language_option.file_name}.txt").read_text().splitlines()
     )
 
 
+@functools.lru_cache(maxsize=8)
+def get_word_pool(language_option: LanguageOption) -> WordPool:
+    """Get the word pool for the given language option, cached per process."""
+    if language_option.file_name in word_bundle:
+        return WordPool(*word_bundle.get(language_option.file_name))
+    return WordPool.from_words(load_language(language_option))
+
+
 def get_random_words(language_option: LanguageOption, count: int) -> list[str]:
     """Get random words from the word list for the given language option."""
-    return random.choices(
-        load_language(language_option),
-        k=count,
-    )
+    return get_word_pool(language_option).sample(count)
 
 
 class Correctness(enum.Enum):
@@ -78,6 +132,11 @@ class Correctness(enum.Enum):
 
 
 user_input_state = ClientStateVar.create("user_input", default="")
+time_left_state = ClientStateVar.create("time_left", default=None)
+
+LINE_LENGTH = 60  # Max letters in a line of words
+VISIBLE_LINES = 3  # Lines of words mounted around the cursor
+TIMER_GRACE = 1  # Seconds a submission may arrive early or late, for clock drift
 
 
 @dataclasses.dataclass
@@ -98,7 +157,13 @@ class OverkeyState(rx.State):
     wpm: rx.Field[float] = rx.field(0)
     accuracy: rx.Field[float] = rx.field(0)
 
-    current_time: rx.Field[int | None] = rx.field(None)
+    # Server time the test started at, the countdown itself runs on the client.
+    started_at: rx.Field[float | None] = rx.field(None)
+    wpm_history: rx.Field[list[dict[str, float]]] = rx.field(default_factory=list)
+
+    anti_cheat: rx.Field[bool] = rx.field(False)
+    keystroke_stats: rx.Field[KeystrokeStats | None] = rx.field(None)
+    _keystrokes: bytes = b""
 
     @rx.var(cache=True)
     def words(self) -> list[str]:
@@ -110,15 +175,6 @@ class OverkeyState(rx.State):
             ]
         return []
 
-    @rx.var(cache=True)
-    def cumulative_word_lengths(self) -> list[int]:
-        """Get the cumulative word lengths for the words."""
-        words_lengths = [len(word) for word in self.words]
-        cumulative_word_lengths = [0]
-        for word_length in words_lengths:
-            cumulative_word_lengths.append(word_length + cumulative_word_lengths[-1])
-        return cumulative_word_lengths
-
     @rx.event
     def set_language_option(self, language_option: str):
         """Set the language option for the user to play with."""
@@ -161,45 +217,82 @@ class OverkeyState(rx.State):
         elif time_limit.endswith(" second"):
             self.time_limit = 1
 
-    @rx.event
-    @rx.event(background=True)
-    async def tick(self):
-        """Tick the timer for the user to complete the words."""
-        await asyncio.sleep(1)
-        async with self:
-            if self.current_time is not None:
-                self.current_time -= 1
-                new_value = self.current_time
-            else:
-                new_value = 0
-
-        if new_value > 0:
-            return OverkeyState.tick
-
     @rx.event
     def start_timer(self):
         """Start the timer for the user to complete the words."""
-        if self.current_time is None:
-            self.current_time = self.time_limit
-            return OverkeyState.tick
+        if self.started_at is None:
+            self.started_at = time.time()
+            self._keystrokes = b""
+            self.keystroke_stats = None
+
+    def _is_time_up(self) -> bool:
+        """Whether the time limit has just passed since the test started.
+
+        A score submitted long after the time limit comes from a client that
+        paused its countdown, so it doesn't count.
+        """
+        if self.started_at is None:
+            return False
+        elapsed = time.time() - self.started_at
+        return self.time_limit - TIMER_GRACE <= elapsed <= self.time_limit + TIMER_GRACE
+
+    @rx.event
+    def set_anti_cheat(self, anti_cheat: bool):
+        """Set whether keystroke timings are recorded to verify the result."""
+        self.anti_cheat = anti_cheat
+
+    @rx.event(background=True)
+    async def verify_keystrokes(self, correct_letters: int):
+        """Analyze the recorded keystrokes without blocking the event loop."""
+        async with self:
+            keystrokes, time_limit = self._keystrokes, self.time_limit
+        keystroke_stats = await asyncio.to_thread(
+            analyze_keystrokes, keystrokes, time_limit, correct_letters
+        )
+        async with self:
+            self.keystroke_stats = keystroke_stats
 
     @rx.event
     def on_load(self):
         """Load the initial state of the Overkey app."""
-        self.current_time = None
+        self.started_at = None
 
     @rx.event
-    def receive_user_input(self, user_input: str):
-        """Receive the user's input."""
-        if not user_input:
+    def receive_score(
+        self,
+        correct_letters: int,
+        typed_letters: int,
+        samples: list[int],
+        keystrokes: str,
+    ):
+        """Receive the score the client computed from the user's input.
+
+        `samples` holds the correct letter count at the end of each second and
+        `keystrokes` the keystroke intervals recorded on the client, as base64
+        encoded varints.
+        """
+        if not typed_letters or not self._is_time_up():
             return
-        current_paragraph = "".join(self.words)
-        correct_letters_count = sum(
-            letter == expected_letter
-            for letter, expected_letter in zip(user_input, current_paragraph)
+        self.wpm = (correct_letters / self.time_limit) * 60 / 5
+        self.accuracy = correct_letters / typed_letters
+        self.wpm_history = [
+            {"second": second, "wpm": round(correct / second * 60 / 5, 1)}
+            for second, correct in enumerate(samples[: self.time_limit], start=1)
+        ]
+        if self.anti_cheat:
+            self._keystrokes = decode_recording(keystrokes)
+            return OverkeyState.verify_keystrokes(correct_letters)
+
+    @rx.var(cache=True)
+    def keystroke_stats_display(self) -> str:
+        """Get a summary of the keystroke analysis."""
+        if self.keystroke_stats is None:
+            return ""
+        return (
+            f"{self.keystroke_stats.consistency:.0%} consistency, "
+            f"{self.keystroke_stats.peak_wpm:.0f} peak WPM, "
+            + ("verified" if self.keystroke_stats.verified else "not verified")
         )
-        self.wpm = (correct_letters_count / self.time_limit) * 60 / 5
-        self.accuracy = correct_letters_count / len(user_input)
 
     @rx.var(cache=True)
     def accuracy_display(self) -> str:
@@ -209,7 +302,9 @@ class OverkeyState(rx.State):
     @rx.event
     def restart(self):
         """Restart the Overkey app."""
-        self.current_time = None
+        self.started_at = None
+        self.wpm_history = []
+        self.keystroke_stats = None
         self.language_option = self.language_option
         self.is_reset = True
         return OverkeyState.witness_is_reset
@@ -220,6 +315,272 @@ class OverkeyState(rx.State):
         self.is_reset = False
 
 
+def client_memo(name: str, expression: str, *deps: rx.Var, var_type: type) -> rx.Var:
+    """A value computed on the client from the given dependencies.
+
+    The expression is hoisted into a `useMemo` hook of the component using the
+    var, so it is evaluated once per change of the dependencies instead of once
+    for every element that references it (e.g. inside an rx.foreach).
+    """
+    hook = rx.Var(
+        f"const {name} = useMemo(() => {{ {expression} }}, [{', '.join(str(dep) for dep in deps)}])"
+    )
+    return rx.Var(
+        _js_expr=name,
+        _var_type=var_type,
+        _var_data=VarData.merge(
+            hook._get_all_var_data(),
+            VarData(imports={"react": ["useMemo"]}, hooks={str(hook): None}),
+        ),
+    )
+
+
+# The words wrapped into lines, as (word, offset of its first letter) pairs.
+word_lines = client_memo(
+    "word_lines",
+    f"""
+        const lines = [];
+        let line = [], line_length = 0, offset = 0;
+        for (const word of {OverkeyState.words}) {{
+            if (line.length && line_length + word.length > {LINE_LENGTH}) {{
+                lines.push(line);
+                line = [];
+                line_length = 0;
+            }}
+            line.push([word, offset]);
+            line_length += word.length;
+            offset += word.length;
+        }}
+        if (line.length) lines.push(line);
+        return lines;
+    """,
+    OverkeyState.words,
+    var_type=list[list[tuple[str, int]]],
+)
+
+# The lines around the cursor, the only ones that are mounted.
+visible_lines = client_memo(
+    "visible_lines",
+    f"""
+        const lines = {word_lines};
+        const cursor = {user_input_state.value}.length;
+        let low = 0, high = lines.length - 1;
+        while (low < high) {{
+            const mid = (low + high + 1) >> 1;
+            if (lines[mid][0][1] <= cursor) low = mid;
+            else high = mid - 1;
+        }}
+        const first = Math.max(0, low - 1);
+        return lines.slice(first, first + {VISIBLE_LINES});
+    """,
+    word_lines,
+    user_input_state.value,
+    var_type=list[list[tuple[str, int]]],
+)
+
+
+def client_ref(name: str, initial: str) -> rx.Var:
+    """A mutable object kept on the client across renders, like `useRef`."""
+    return rx.Var(
+        _js_expr=f"{name}.current",
+        _var_type=dict,
+        _var_data=VarData(
+            imports={"react": ["useRef"]},
+            hooks={f"const {name} = useRef({initial})": None},
+        ),
+    )
+
+
+# The count of correct letters so far, with the input and paragraph it is for.
+correct_letters_running = client_ref(
+    "correct_letters_running", '{ words: null, paragraph: "", input: "", correct: 0 }'
+)
+
+# Number of letters the user typed that match the paragraph. The input only
+# changes at its end (the caret is kept there), so only the letters past the
+# shorter of the previous and current input are compared on each keystroke.
+correct_letters = client_memo(
+    "correct_letters",
+    f"""
+        const running = {correct_letters_running};
+        const words = {OverkeyState.words};
+        if (running.words !== words) {{
+            running.words = words;
+            running.paragraph = words.join("");
+            running.input = "";
+            running.correct = 0;
+        }}
+        const paragraph = running.paragraph;
+        const previous = running.input;
+        const user_input = {user_input_state.value};
+        const common = Math.min(previous.length, user_input.length);
+        let correct = running.correct;
+        for (let i = common; i < previous.length; i++) correct -= previous[i] === paragraph[i];
+        for (let i = common; i < user_input.length; i++) correct += user_input[i] === paragraph[i];
+        running.input = user_input;
+        running.correct = correct;
+        return correct;
+    """,
+    OverkeyState.words,
+    user_input_state.value,
+    var_type=int,
+)
+
+# Moves the caret of the input back to its end whenever it is moved or text is
+# selected, so typing can only append or delete at the end.
+keep_caret_at_end = rx.Var(
+    "((event) => { const length = event.target.value.length; "
+    "event.target.setSelectionRange(length, length); })"
+)
+
+# Correct letter counts sampled at the end of each second of the test.
+wpm_samples = rx.Var(
+    _js_expr="(refs['overkey_wpm_samples'] ?? [])",
+    _var_type=list[int],
+    _var_data=VarData(imports={"$/utils/state": ["refs"]}),
+)
+
+
+class Countdown(rx.Fragment):
+    """A component that counts down the time left in the test on the client.
+
+    The backend only stores when the test started, so the countdown costs no
+    events. The time left is written to `time_left_state`.
+    """
+
+    # Server time the test started at, None before it starts
+    started_at: rx.Var[float | None]
+
+    # Length of the test in seconds
+    time_limit: rx.Var[int]
+
+    def add_imports(self) -> ImportDict:
+        return {"react": "useEffect"}
+
+    def add_hooks(self) -> list[str | rx.Var[str]]:
+        set_time_left = time_left_state.set
+        return [
+            rx.Var(
+                f"""
+            useEffect(() => {{
+                if ({self.started_at} === null) {{
+                    {set_time_left}(null);
+                    return;
+                }}
+                const start = performance.now();
+                const update = () => {{
+                    const elapsed = Math.floor((performance.now() - start) / 1000);
+                    const time_left = Math.max(0, {self.time_limit} - elapsed);
+                    {set_time_left}(time_left);
+                    if (time_left === 0) clearInterval(interval);
+                }};
+                const interval = setInterval(update, 100);
+                update();
+                return () => clearInterval(interval);
+            }}, [{self.started_at}])
+            """
+            ),
+        ]
+
+    def render(self) -> dict:
+        # This component has no visual element.
+        return {}
+
+
+class ScoreSampler(rx.Fragment):
+    """A component that records the correct letter count every second.
+
+    The samples are kept on the client and only sent to the backend, together
+    with the final score, when the time is up.
+    """
+
+    # Seconds left in the test, None before it starts
+    time_left: rx.Var[int | None]
+
+    # Number of correct letters typed so far
+    correct_letters: rx.Var[int]
+
+    def add_imports(self) -> ImportDict:
+        return {"react": "useEffect", "$/utils/state": "refs"}
+
+    def add_hooks(self) -> list[str | rx.Var[str]]:
+        return [
+            rx.Var(
+                f"""
+            useEffect(() => {{
+                const time_left = {self.time_left};
+                if (time_left === null) {{
+                    refs['overkey_wpm_samples'] = [];
+                }} else if (time_left < {OverkeyState.time_limit}) {{
+                    refs['overkey_wpm_samples'].push({self.correct_letters});
+                }}
+            }}, [{self.time_left}])
+            """
+            ),
+        ]
+
+    def render(self) -> dict:
+        # This component has no visual element.
+        return {}
+
+
+# The keystroke intervals recorded on the client, as base64 encoded varints.
+keystroke_log = rx.Var(
+    _js_expr="btoa(refs['overkey_keystrokes'] ?? '')",
+    _var_type=str,
+    _var_data=VarData(imports={"$/utils/state": ["refs"]}),
+)
+
+
+class KeystrokeRecorder(rx.Fragment):
+    """A component that records the time between keystrokes.
+
+    Recording starts with the first keypress on the client, so the keystroke
+    that starts the test is captured without waiting for the backend.
+    Intervals are in milliseconds, encoded as unsigned LEB128 varints and kept
+    on the client until they are sent, together with the final score, when the
+    time is up.
+    """
+
+    # Whether keystrokes are being recorded
+    recording: rx.Var[bool]
+
+    def add_imports(self) -> ImportDict:
+        return {"react": "useEffect", "$/utils/state": "refs"}
+
+    def add_hooks(self) -> list[str | rx.Var[str]]:
+        return [
+            rx.Var(
+                f"""
+            useEffect(() => {{
+                if (!{self.recording}) return;
+                refs['overkey_keystrokes'] = "";
+                let last = null;
+                const record = (event) => {{
+                    if (event.key.length !== 1 && event.key !== "Backspace") return;
+                    const now = performance.now();
+                    // The keystroke that starts the test is the first interval.
+                    let value = last === null ? 0 : Math.round(now - last);
+                    last = now;
+                    let bytes = refs['overkey_keystrokes'];
+                    if (bytes.length >= {MAX_RECORDING_BYTES}) return;
+                    for (; value >= 0x80; value >>>= 7) {{
+                        bytes += String.fromCharCode((value & 0x7f) | 0x80);
+                    }}
+                    refs['overkey_keystrokes'] = bytes + String.fromCharCode(value);
+                }};
+                document.addEventListener("keydown", record, true);
+                return () => document.removeEventListener("keydown", record, true);
+            }}, [{self.recording}])
+            """
+            ),
+        ]
+
+    def render(self) -> dict:
+        # This component has no visual element.
+        return {}
+
+
 def render_letter(letter: StringVar, letter_index: NumberVar) -> rx.Component:
     """Render a letter for the user to complete."""
     user_input_length = user_input_state.value.length()
@@ -246,14 +607,13 @@ def render_letter(letter: StringVar, letter_index: NumberVar) -> rx.Component:
     )
 
 
-def render_word(word: StringVar, word_index: NumberVar) -> rx.Component:
+def render_word(word_and_offset: rx.Var[tuple[str, int]]) -> rx.Component:
     """Render a word for the user to complete."""
+    word, offset = word_and_offset[0].to(str), word_and_offset[1].to(int)
     return rx.hstack(
         rx.foreach(
             word.split(),
-            lambda letter, letter_index: render_letter(
-                letter, letter_index + OverkeyState.cumulative_word_lengths[word_index]
-            ),
+            lambda letter, letter_index: render_letter(letter, letter_index + offset),
         ),
         class_name="word",
         width=f"{word.length()}ch",
@@ -261,8 +621,13 @@ def render_word(word: StringVar, word_index: NumberVar) -> rx.Component:
     )
 
 
+def render_line(line: rx.Var[list[tuple[str, int]]]) -> rx.Component:
+    """Render a line of words for the user to complete."""
+    return rx.flex(rx.foreach(line, render_word))
+
+
 @rx.memo
-def time_is_up():
+def time_is_up(correct_letters: rx.Var[int]):
     """Render a message when time is up."""
     return rx.flex(
         "Time's up!",
@@ -276,7 +641,12 @@ def time_is_up():
         font_size="3em",
         font_weight="900",
         backdrop_filter="blur(2px)",
-        on_mount=OverkeyState.receive_user_input(user_input_state.value),
+        on_mount=OverkeyState.receive_score(
+            correct_letters,
+            user_input_state.value.length(),
+            wpm_samples,
+            keystroke_log,
+        ),
     )
 
 
@@ -288,13 +658,26 @@ def witness_is_reset():
     )
 
 
+def wpm_chart() -> rx.Component:
+    """Render the WPM of the user over the course of the test."""
+    return rx.recharts.line_chart(
+        rx.recharts.line(data_key="wpm", dot=False),
+        rx.recharts.x_axis(data_key="second"),
+        rx.recharts.y_axis(),
+        rx.recharts.graphing_tooltip(),
+        data=OverkeyState.wpm_history,
+        width="100%",
+        height=200,
+    )
+
+
 def index() -> rx.Component:
     """Render the Overkey app."""
     return rx.center(
         rx.vstack(
             rx.hstack(
                 rx.cond(
-                    OverkeyState.current_time.is_not_none(),
+                    OverkeyState.started_at.is_not_none(),
                     rx.fragment(
                         rx.icon_button(
                             "rotate-ccw",
@@ -304,9 +687,9 @@ def index() -> rx.Component:
                         ),
                         rx.flex(
                             rx.cond(
-                                OverkeyState.current_time == 0,
-                                f"{OverkeyState.wpm} WPM, {OverkeyState.accuracy_display} accuracy",
-                                OverkeyState.current_time,
+                                time_left_state.value == 0,
+                                f"{OverkeyState.wpm} WPM, {OverkeyState.accuracy_display} accuracy {OverkeyState.keystroke_stats_display}",
+                                time_left_state.value,
                             ),
                             flex="1",
                             align="center",
@@ -334,6 +717,13 @@ def index() -> rx.Component:
                             value=OverkeyState.selected_time_limit,
                             on_change=OverkeyState.set_time_limit,
                         ),
+                        rx.tooltip(
+                            rx.switch(
+                                checked=OverkeyState.anti_cheat,
+                                on_change=OverkeyState.set_anti_cheat,
+                            ),
+                            content="Verify keystrokes",
+                        ),
                     ),
                 ),
                 justify="center",
@@ -343,18 +733,31 @@ def index() -> rx.Component:
             ),
             rx.vstack(
                 user_input_state,
+                time_left_state,
+                Countdown.create(
+                    started_at=OverkeyState.started_at,
+                    time_limit=OverkeyState.time_limit,
+                ),
+                ScoreSampler.create(
+                    time_left=time_left_state.value,
+                    correct_letters=correct_letters,
+                ),
+                KeystrokeRecorder.create(
+                    recording=OverkeyState.anti_cheat & (time_left_state.value != 0),
+                ),
                 rx.flex(
-                    rx.foreach(OverkeyState.words, render_word),
+                    rx.foreach(visible_lines, render_line),
                     id="words",
-                    wrap="wrap",
+                    direction="column",
                     font_family="monospace",
                     font_size="1.5em",
-                    max_width="60ch",
+                    width=f"{LINE_LENGTH}ch",
+                    max_width="100%",
                 ),
                 rx.fragment(
                     rx.cond(
-                        OverkeyState.current_time == 0,
-                        time_is_up(),
+                        time_left_state.value == 0,
+                        time_is_up(correct_letters=correct_letters),
                         rx.el.input(
                             value=user_input_state.value,
                             on_change=user_input_state.set_value,
@@ -363,6 +766,7 @@ def index() -> rx.Component:
                                 OverkeyState.start_timer(),
                                 rx.console_log("Timer already started"),
                             ),
+                            custom_attrs={"onSelect": keep_caret_at_end},
                             opacity=0,
                             position="absolute",
                             top=0,
@@ -375,6 +779,10 @@ def index() -> rx.Component:
                 position="relative",
                 padding="1em 0.25em",
             ),
+            rx.cond(
+                (time_left_state.value == 0) & (OverkeyState.wpm_history.length() > 0),
+                wpm_chart(),
+            ),
             rx.text(
                 "Credit of word lists: ",
                 rx.link(
@@ -0,0 +1,147 @@
+"""A single binary file holding every word list, for memory-mapped loading.
+
+Layout (all integers little-endian):
+
+    header:  magic b"OVKW", version u32, language count u32
+    index:   per language: name length u16, name (UTF-8), word count u32,
+             offsets position u64, blob position u64
+    data:    per language: (word count + 1) u32 byte offsets into its blob,
+             followed by the blob of UTF-8 encoded words
+
+Word `i` of a language is `blob[offsets[i]:offsets[i + 1]]`.
+
+Build the bundle with `python -m overkey.word_bundle`. It is also rebuilt on
+startup when it is missing or older than the word lists.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+WORD_LISTS_DIR = Path(__file__).parent.parent / "word_lists"
+BUNDLE_PATH = Path(__file__).parent.parent / "word_lists.bin"
+
+MAGIC = b"OVKW"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+INDEX_NAME_LENGTH = struct.Struct("<H")
+INDEX_ENTRY = struct.Struct("<IQQ")
+OFFSET_SIZE = 4
+
+
+def build_bundle(
+    word_lists_dir: Path = WORD_LISTS_DIR, bundle_path: Path = BUNDLE_PATH
+) -> None:
+    """Pack every `.txt` word list in the directory into one bundle file."""
+    languages = {
+        path.stem: [
+            word.encode() for word in path.read_text(encoding="utf-8").splitlines()
+        ]
+        for path in sorted(word_lists_dir.glob("*.txt"))
+    }
+
+    index_size = sum(
+        INDEX_NAME_LENGTH.size + len(name.encode()) + INDEX_ENTRY.size
+        for name in languages
+    )
+    position = HEADER.size + index_size
+    index, data = [], []
+    for name, words in languages.items():
+        offsets = [0]
+        for word in words:
+            offsets.append(offsets[-1] + len(word))
+        offsets_position = position
+        blob_position = offsets_position + OFFSET_SIZE * len(offsets)
+        position = blob_position + offsets[-1]
+
+        encoded_name = name.encode()
+        index.append(INDEX_NAME_LENGTH.pack(len(encoded_name)) + encoded_name)
+        index.append(INDEX_ENTRY.pack(len(words), offsets_position, blob_position))
+        data.append(struct.pack(f"<{len(offsets)}I", *offsets))
+        data.append(b"".join(words))
+
+    # Each process writes its own temporary file, as workers starting together
+    # may all build the bundle.
+    with tempfile.NamedTemporaryFile(
+        dir=bundle_path.parent,
+        prefix=f"{bundle_path.stem}.",
+        suffix=".tmp",
+        delete=False,
+    ) as f:
+        try:
+            f.write(HEADER.pack(MAGIC, VERSION, len(languages)))
+            f.writelines(index)
+            f.writelines(data)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    # Atomic, so workers never map a half written bundle.
+    os.replace(f.name, bundle_path)
+
+
+def is_stale(
+    word_lists_dir: Path = WORD_LISTS_DIR, bundle_path: Path = BUNDLE_PATH
+) -> bool:
+    """Whether the bundle is missing or older than any of the word lists."""
+    if not bundle_path.exists():
+        return True
+    built_at = bundle_path.stat().st_mtime
+    return any(path.stat().st_mtime > built_at for path in word_lists_dir.glob("*.txt"))
+
+
+class WordBundle:
+    """A read-only, memory-mapped word bundle.
+
+    The mapping is shared by every process that opens the same file, so
+    forked workers do not each hold a copy of the word lists.
+    """
+
+    def __init__(self, bundle_path: Path = BUNDLE_PATH):
+        with bundle_path.open("rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, version, count = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{bundle_path} is not a version {VERSION} word bundle")
+
+        self._languages: dict[str, tuple[memoryview, memoryview]] = {}
+        position = HEADER.size
+        for _ in range(count):
+            (name_length,) = INDEX_NAME_LENGTH.unpack_from(view, position)
+            position += INDEX_NAME_LENGTH.size
+            name = bytes(view[position : position + name_length]).decode()
+            position += name_length
+            word_count, offsets_position, blob_position = INDEX_ENTRY.unpack_from(
+                view, position
+            )
+            position += INDEX_ENTRY.size
+
+            # memoryview casts use the native byte order, little-endian here.
+            offsets = view[
+                offsets_position : offsets_position + OFFSET_SIZE * (word_count + 1)
+            ].cast("I")
+            blob = view[blob_position : blob_position + offsets[-1]]
+            self._languages[name] = (blob, offsets)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._languages
+
+    def get(self, name: str) -> tuple[memoryview, memoryview]:
+        """The UTF-8 blob and word offsets of the named word list."""
+        return self._languages[name]
+
+
+def open_bundle() -> WordBundle:
+    """Open the word bundle, building it first if it is stale."""
+    if is_stale():
+        build_bundle()
+    return WordBundle()
+
+
+if __name__ == "__main__":
+    build_bundle()
+    print(f"Wrote {BUNDLE_PATH}")
@@ -0,0 +1,165 @@
+"""Global leaderboard for the snake game.
+
+Scores are kept in memory as a bounded top-K min-heap per time window and
+board size, so reading the leaderboard never touches the database and games
+are only ranked against others on the same board size. New scores are queued
+and written to the HighScore table in batches by a background flusher, which
+coalesces bursts of game overs into a single commit.
+
+The in-memory heaps are per process; each worker warms its own copy from the
+database at startup.
+"""
+
+import asyncio
+import contextlib
+import datetime
+import heapq
+
+import sqlmodel
+
+import reflex as rx
+
+TOP_K = 10  # Number of scores kept per window and board size
+FLUSH_INTERVAL = 2  # Seconds to wait for more scores before writing a batch
+FLUSH_BATCH_SIZE = 500  # Max number of scores written per commit
+MAX_NAME_LENGTH = 20  # Longest player name stored on the leaderboard
+
+DAILY = "daily"
+WEEKLY = "weekly"
+ALL_TIME = "all-time"
+WINDOWS = [DAILY, WEEKLY, ALL_TIME]
+
+
+class HighScore(rx.Model, table=True):
+    """A table of finished games."""
+
+    name: str
+    score: int = sqlmodel.Field(index=True)
+    size: int
+    timestamp: datetime.datetime = sqlmodel.Field(index=True)
+
+
+def window_start(window: str, now: datetime.datetime) -> datetime.datetime:
+    """The start (in UTC) of the given window that contains `now`."""
+    if window == ALL_TIME:
+        return datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == WEEKLY:
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+def clean_name(name: str) -> str:
+    """A player name safe to store and show: printable, trimmed and capped."""
+    name = " ".join(
+        "".join(ch for ch in name if ch.isprintable() or ch.isspace()).split()
+    )
+    return name[:MAX_NAME_LENGTH].strip() or "anonymous"
+
+
+def as_utc(timestamp: datetime.datetime) -> datetime.datetime:
+    """A timestamp read back from the database, as an aware UTC datetime.
+
+    Timestamps are stored in UTC, but SQLite returns them without a timezone,
+    and naive and aware datetimes can't be compared in the heaps.
+    """
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp.astimezone(datetime.timezone.utc)
+
+
+class Leaderboard:
+    """Bounded top-K scores per window, with batched persistence."""
+
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        # (window, size) -> (window start, min-heap of (score, timestamp, name))
+        self._heaps: dict[tuple[str, int], tuple[datetime.datetime, list]] = {}
+        self._pending: list[HighScore] = []
+        self._wakeup = asyncio.Event()
+
+    def _heap(self, window: str, size: int, now: datetime.datetime) -> list:
+        """The heap for the current period of the window, rolled over if stale."""
+        start = window_start(window, now)
+        current = self._heaps.get((window, size))
+        if current is None or current[0] != start:
+            current = self._heaps[window, size] = (start, [])
+        return current[1]
+
+    def _push(self, size: int, entry: tuple[int, datetime.datetime, str]):
+        """Offer a score to the heap of every window for its board size."""
+        for window in WINDOWS:
+            heap = self._heap(window, size, entry[1])
+            if len(heap) < self.k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    def submit(self, name: str, score: int, size: int):
+        """Record a finished game. Never blocks on the database."""
+        name = clean_name(name)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self._push(size, (score, now, name))
+        self._pending.append(
+            HighScore(name=name, score=score, size=size, timestamp=now)
+        )
+        self._wakeup.set()
+
+    def top(self, window: str, size: int) -> list[tuple[str, int]]:
+        """The best scores on a board size in the window, highest first."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        heap = self._heap(window, size, now)
+        return [(name, score) for score, _, name in sorted(heap, reverse=True)]
+
+    def load(self):
+        """Warm the heaps from the database, creating the table if needed."""
+        rx.Model.create_all()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with rx.session() as session:
+            sizes = session.exec(sqlmodel.select(HighScore.size).distinct()).all()
+            for window in WINDOWS:
+                start = window_start(window, now)
+                for size in sizes:
+                    rows = session.exec(
+                        HighScore.select()
+                        .where(HighScore.size == size, HighScore.timestamp >= start)
+                        .order_by(HighScore.score.desc())  # type: ignore
+                        .limit(self.k)
+                    ).all()
+                    heap = [
+                        (row.score, as_utc(row.timestamp), row.name) for row in rows
+                    ]
+                    heapq.heapify(heap)
+                    self._heaps[window, size] = (start, heap)
+
+    def flush(self):
+        """Write queued scores to the database in batches."""
+        while self._pending:
+            batch = self._pending[:FLUSH_BATCH_SIZE]
+            del self._pending[:FLUSH_BATCH_SIZE]
+            with rx.session() as session:
+                session.add_all(batch)
+                session.commit()
+
+    async def run_flusher(self):
+        """Flush queued scores, waiting a little to coalesce bursts."""
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+
+leaderboard = Leaderboard()
+
+
+@contextlib.asynccontextmanager
+async def leaderboard_lifespan():
+    """Warm the leaderboard on startup and flush it in the background."""
+    await asyncio.to_thread(leaderboard.load)
+    flusher = asyncio.create_task(leaderboard.run_flusher())
+    try:
+        yield
+    finally:
+        flusher.cancel()
+        await asyncio.to_thread(leaderboard.flush)
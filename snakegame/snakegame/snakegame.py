@@ -7,7 +7,18 @@ from reflex.constants.colors import Color
 from reflex.event import EventSpec
 from reflex.utils.imports import ImportDict
 
-N = 19  # There is a N*N grid for ground of snake
+from .leaderboard import (
+    ALL_TIME,
+    MAX_NAME_LENGTH,
+    WINDOWS,
+    leaderboard,
+    leaderboard_lifespan,
+)
+
+N = 19  # There is a N*N grid for ground of snake (default size)
+MAX_N = 100  # Largest supported board, the canvas renderer keeps this at 60 fps
+BOARD_SIZES = [19, 30, 50, 75, MAX_N]  # Sizes offered in the UI
+CELL_PX = 10  # Size of one grid square in canvas pixels
 GRID_EMPTY = 0
 GRID_SNAKE = 1
 GRID_FOOD = 2
@@ -28,23 +39,34 @@ INITIAL_SNAKE = [  # all (X,Y) for snake's body
 INITIAL_FOOD = (5, 5)  # X, Y of food
 
 
-def get_new_head(old_head: tuple[int, int], dir: tuple[int, int]) -> tuple[int, int]:
+def get_new_head(
+    old_head: tuple[int, int], dir: tuple[int, int], n: int = N
+) -> tuple[int, int]:
     """Calculate the new head position based on the given direction."""
     x, y = old_head
-    return (x + dir[0] + N) % N, (y + dir[1] + N) % N
+    return (x + dir[0] + n) % n, (y + dir[1] + n) % n
 
 
-def to_cell_index(x: int, y: int) -> int:
+def to_cell_index(x: int, y: int, n: int = N) -> int:
     """Calculate the index into the game board for the given (X, Y)."""
-    return x + N * y
+    return x + n * y
+
+
+def empty_board(n: int) -> str:
+    """A packed n*n game board with every square empty.
+
+    The board is packed as one character per square (the GRID_* value), which
+    is much cheaper to diff and ship to the frontend than a list of ints.
+    """
+    return str(GRID_EMPTY) * (n * n)
 
 
 class Colors(rx.State):
     """Colors of different grid square types for frontend rendering."""
 
-    # Why is this not just a global? Because we index into the dict with state
-    # vars in an rx.foreach, so this dict needs to be accessible in the compiled
-    # frontend.
+    # Why is this not just a global? Because the BoardCanvas looks up the fill
+    # color for each packed cell value, so this dict needs to be accessible in
+    # the compiled frontend.
     c: dict[int, Color] = {
         GRID_EMPTY: rx.color("gray", 5),
         GRID_SNAKE: rx.color("grass", 9),
@@ -58,13 +80,17 @@ class State(rx.State):
     moves: list[tuple[int, int]] = []  # Queue of moves based on user input
     snake: list[tuple[int, int]] = INITIAL_SNAKE  # Body of snake
     food: tuple[int, int] = INITIAL_FOOD  # X, Y location of food
-    cells: list[int] = (N * N) * [GRID_EMPTY]  # The game board to be rendered
+    size: int = N  # Width and height of the board
+    cells: str = empty_board(N)  # The packed game board to be rendered
     score: int = 0  # Player score
     magic: int = 1  # Number of points per food eaten
     rate: int = 10  # 5 divide by rate determines tick period
     died: bool = False  # If the snake is dead (game over)
     tick_cnt: int = 1  # How long the game has been running
     running: bool = False
+    player: str = "anonymous"  # Name recorded on the leaderboard
+    leaderboard_window: str = ALL_TIME  # Which leaderboard is displayed
+    leaders: list[tuple[str, int]] = []  # (name, score) of the top players
     _n_tasks: int = 0
 
     @rx.event
@@ -73,7 +99,7 @@ class State(rx.State):
         if not self.running:
             if self.died:
                 # If the player is dead, reset game state before beginning.
-                self.reset()
+                self._reset_game()
             self.running = True
             return State.loop
 
@@ -90,6 +116,38 @@ class State(rx.State):
         else:
             return State.pause
 
+    @rx.event
+    def set_board_size(self, size: str):
+        """Resize the board, which starts a new game."""
+        self.running = False
+        self.size = max(N, min(int(size), MAX_N))
+        self._reset_game()
+
+    @rx.event
+    def set_player(self, player: str):
+        """Set the name recorded on the leaderboard."""
+        # Keep spaces while typing; the name is trimmed when a score is saved.
+        self.player = "".join(ch for ch in player if ch.isprintable())[:MAX_NAME_LENGTH]
+
+    @rx.event
+    def load_leaderboard(self):
+        """Show the in-memory leaderboard for the selected window and board."""
+        self.leaders = leaderboard.top(self.leaderboard_window, self.size)
+
+    @rx.event
+    def set_leaderboard_window(self, window: str):
+        """Switch between the daily, weekly and all-time leaderboards."""
+        self.leaderboard_window = window
+        self.load_leaderboard()
+
+    def _reset_game(self):
+        """Reset the game state, keeping the board size and leaderboard."""
+        size, player, window = self.size, self.player, self.leaderboard_window
+        self.reset()
+        self.size, self.player, self.leaderboard_window = size, player, window
+        self.cells = empty_board(size)
+        self.load_leaderboard()
+
     def _next_move(self):
         """Returns the next direction the snake head should move in."""
         return self.moves[0] if self.moves else self.dir
@@ -114,6 +172,12 @@ class State(rx.State):
             # Sleep based on the current rate
             await asyncio.sleep(5 / self.rate)
             async with self:
+                n = self.size
+                cells = bytearray(self.cells, "ascii")
+
+                def set_cell(pos: tuple[int, int], grid_square_type: int):
+                    cells[to_cell_index(*pos, n=n)] = ord(str(grid_square_type))
+
                 # Which direction will the snake move?
                 self.dir = self._next_move()
                 if self.moves:
@@ -121,31 +185,35 @@ class State(rx.State):
                     del self.moves[0]
 
                 # Calculate new head position
-                head = get_new_head(self.snake[-1], dir=self.dir)
+                head = get_new_head(self.snake[-1], dir=self.dir, n=n)
                 if head in self.snake:
                     # New head position crashes into snake body, Game Over
                     self.running = False
                     self.died = True
-                    self.cells[to_cell_index(*head)] = GRID_DEAD
+                    set_cell(head, GRID_DEAD)
+                    self.cells = cells.decode("ascii")
+                    leaderboard.submit(self.player, self.score, n)
+                    self.load_leaderboard()
                     break
 
                 # Move the snake
                 self.snake.append(head)
-                self.cells[to_cell_index(*head)] = GRID_SNAKE
+                set_cell(head, GRID_SNAKE)
                 food_eaten = False
                 while self.food in self.snake:
                     food_eaten = True
-                    self.food = (random.randint(0, N - 1), random.randint(0, N - 1))
-                self.cells[to_cell_index(*self.food)] = GRID_FOOD
+                    self.food = (random.randint(0, n - 1), random.randint(0, n - 1))
+                set_cell(self.food, GRID_FOOD)
                 if not food_eaten:
                     # Advance the snake
-                    self.cells[to_cell_index(*self.snake[0])] = GRID_EMPTY
+                    set_cell(self.snake[0], GRID_EMPTY)
                     del self.snake[0]
                 else:
                     # Grow the snake (and the score)
                     self.score += self.magic
                     self.magic += 1
                     self.rate = 10 + self.magic
+                self.cells = cells.decode("ascii")
                 self.tick_cnt += 1
 
         async with self:
@@ -244,14 +312,74 @@ class GlobalKeyWatcher(rx.Fragment):
         return {}
 
 
-def colored_box(grid_square_type: int):
-    """One square of the game grid."""
-    return rx.box(
-        background_color=Colors.c[grid_square_type],
-        width="1em",
-        height="1em",
-        border=f"1px solid {rx.color('gray', 2)}",
-    )
+class BoardCanvas(rx.el.Canvas):
+    """A canvas that draws the game board from a packed cell buffer.
+
+    Rendering one element per grid square does not scale past small boards, so
+    this draws the squares directly. Only squares whose value changed since
+    the last frame are repainted, and drawing is scheduled with
+    requestAnimationFrame so bursts of updates collapse into a single frame.
+
+    Requires custom javascript to support this functionality at the moment.
+    """
+
+    # The packed board, one GRID_* character per square
+    cells: rx.Var[str]
+
+    # Width and height of the board in squares
+    size: rx.Var[int]
+
+    # Mapping of GRID_* value to CSS color
+    palette: rx.Var[dict[int, Color]]
+
+    def add_imports(self) -> ImportDict:
+        return {"react": ["useEffect", "useRef"]}
+
+    def _exclude_props(self) -> list[str]:
+        # These are only read by the drawing hook, not the canvas element.
+        return ["cells", "size", "palette"]
+
+    def add_hooks(self) -> list[str | rx.Var[str]]:
+        ref = self.get_ref()
+        return [
+            rx.Var(
+                f"""
+            const {ref}_drawn = useRef({{cells: "", size: 0, fills: ""}});
+            // Color mode is a dependency so the palette is re-resolved on toggle.
+            useEffect(() => {{
+                const cells = {self.cells};
+                const size = {self.size};
+                const palette = {self.palette};
+                const frame = requestAnimationFrame(() => {{
+                    const canvas = {ref}.current;
+                    if (!canvas) return;
+                    // Resolve CSS variables, canvas fill styles cannot use them.
+                    const style = getComputedStyle(canvas);
+                    const fills = {{}};
+                    for (const [key, color] of Object.entries(palette)) {{
+                        const css_var = /^var\((--[^)]+)\)$/.exec(color);
+                        fills[key] = css_var ? style.getPropertyValue(css_var[1]).trim() : color;
+                    }}
+                    const fills_key = JSON.stringify(fills);
+                    const drawn = {ref}_drawn.current;
+                    const full = drawn.size !== size || drawn.fills !== fills_key || drawn.cells.length !== cells.length;
+                    if (canvas.width !== size * {CELL_PX}) {{
+                        canvas.width = canvas.height = size * {CELL_PX};
+                    }}
+                    const ctx = canvas.getContext("2d");
+                    if (full) ctx.clearRect(0, 0, canvas.width, canvas.height);
+                    for (let i = 0; i < cells.length; i++) {{
+                        if (!full && cells[i] === drawn.cells[i]) continue;
+                        ctx.fillStyle = fills[cells[i]];
+                        ctx.fillRect((i % size) * {CELL_PX}, Math.floor(i / size) * {CELL_PX}, {CELL_PX} - 1, {CELL_PX} - 1);
+                    }}
+                    {ref}_drawn.current = {{cells, size, fills: fills_key}};
+                }});
+                return () => cancelAnimationFrame(frame);
+            }}, [{self.cells}, {self.size}, {self.palette}, {rx.style.resolved_color_mode}])
+            """
+            ),
+        ]
 
 
 def stat_box(label, value):
@@ -338,6 +466,29 @@ def controls_panel():
     )
 
 
+def leaderboard_panel():
+    """The top scores for the selected time window."""
+    return rx.vstack(
+        rx.select(
+            WINDOWS,
+            value=State.leaderboard_window,
+            on_change=State.set_leaderboard_window,
+        ),
+        rx.foreach(
+            State.leaders,
+            lambda leader, rank: rx.hstack(
+                rx.text(rank + 1),
+                rx.text(leader[0]),
+                rx.spacer(),
+                rx.text(leader[1], weight="bold"),
+                width="100%",
+            ),
+        ),
+        align="center",
+        width="20em",
+    )
+
+
 def index():
     return rx.vstack(
         rx.color_mode.button(position="top-right"),
@@ -362,16 +513,36 @@ def index():
             stat_box("SCORE", State.score),
             stat_box("MAGIC", State.magic),
         ),
-        # Usage of foreach, please refer https://reflex.app/docs/library/layout/foreach
-        rx.grid(
-            rx.foreach(
-                State.cells,
-                colored_box,
+        rx.hstack(
+            rx.text("BOARD"),
+            rx.select(
+                [str(size) for size in BOARD_SIZES],
+                value=State.size.to_string(),
+                on_change=State.set_board_size,
+                disabled=State.running,
             ),
-            columns=f"{N}",
+            align="center",
+        ),
+        BoardCanvas.create(
+            id="snake_board",
+            cells=State.cells,
+            size=State.size,
+            palette=Colors.c,
+            style={
+                "width": "min(90vw, 30em)",
+                "aspect_ratio": "1",
+                "image_rendering": "pixelated",
+            },
         ),
         rx.cond(State.died, rx.heading("Game Over 🐍")),
         controls_panel(),
+        rx.input(
+            value=State.player,
+            on_change=State.set_player,
+            placeholder="Your name",
+            max_length=MAX_NAME_LENGTH,
+        ),
+        leaderboard_panel(),
         padding_top="3%",
         spacing="2",
         align="center",
@@ -379,4 +550,5 @@ def index():
 
 
 app = rx.App()
-app.add_page(index, title="snake game")
+app.add_page(index, title="snake game", on_load=State.load_leaderboard)
+app.register_lifespan_task(leaderboard_lifespan)